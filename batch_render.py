@@ -0,0 +1,219 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from hr_log import BINARY_SUFFIX
+from video_encoders import DEFAULT_ENCODER, ENCODERS
+from video_renderer import BEAT_SOURCE, GAP_POLICY, HEIGHT, INTERPOLATION, OUTPUT_DIR, OverlayLayout, render_video
+
+# ============================================================
+# CONFIG
+# ============================================================
+LOGS_DIR = "heartrate_overlay/logs"
+COLOR_INTERVALS_PATH = "heartrate_overlay/config/color_intervals.txt"
+DEFAULT_HR_INTERVALS = (0, 150)  # when the GUI hasn't saved any, same fallback as main.py
+LOG_SUFFIXES = (".csv", BINARY_SUFFIX)
+
+
+# ============================================================
+# INPUTS
+# ============================================================
+def find_logs(inputs):
+    """Expands log files, glob patterns and directories (their logs, not recursive) into log paths."""
+    logs = []
+
+    for item in inputs:
+        matches = sorted(glob.glob(item)) if glob.has_magic(item) else [item]
+        for match in map(Path, matches):
+            if match.is_dir():
+                logs.extend(sorted(p for p in match.iterdir() if p.suffix.lower() in LOG_SUFFIXES))
+            elif match.suffix.lower() in LOG_SUFFIXES:
+                logs.append(match)
+            elif not match.exists():
+                raise FileNotFoundError(f"No such log: {match}")
+
+    # Keep the first of any duplicates, e.g. from overlapping globs
+    return list(dict.fromkeys(p.resolve() for p in logs))
+
+
+def load_color_intervals(path=COLOR_INTERVALS_PATH):
+    """The color intervals last set in the GUI, DEFAULT_HR_INTERVALS if there are none."""
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+        return int(lines[0]), int(lines[1])
+    except (OSError, ValueError, IndexError):
+        return DEFAULT_HR_INTERVALS
+
+
+def parse_time(text):
+    """Seconds from "90", "1:30" or "1:01:30" (hours:minutes:seconds), for the clip options."""
+    try:
+        seconds = 0.0
+        for part in text.split(":"):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a time: {text!r}, use seconds or H:MM:SS")
+    return seconds
+
+
+# ============================================================
+# BATCH
+# ============================================================
+def _render_log(log_path, hr_intervals, render_options):
+    """Renders one log in a pool process. Never raises: failures are part of the result."""
+    stats = {}
+    start = time.perf_counter()
+
+    try:
+        output_file = render_video(str(log_path), *hr_intervals, stats=stats, **render_options)
+    except Exception as e:
+        return {"log": str(log_path), "status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+    elapsed = time.perf_counter() - start
+    encoded = stats["frame_cache_hits"] + stats["frame_cache_misses"]
+    return {
+        "log": str(log_path),
+        "output": output_file,
+        "status": "up-to-date" if stats["cache_hit"] else "rendered",
+        "total_frames": stats["total_frames"],
+        "encoded_frames": encoded,
+        "reused_frames": stats["reused_frames"],
+        "resumed_frames": stats["resumed_frames"],
+        "elapsed_seconds": elapsed,
+        "fps": encoded / elapsed if elapsed > 0 else 0.0,
+        "stage_seconds": stats["stage_seconds"],
+    }
+
+
+def batch_render(logs, hr_intervals, jobs=None, workers=None, render_options=None, log_callback=print):
+    """
+    Renders every log, jobs logs at a time in separate processes, each with workers segment
+    workers of its own. By default jobs is the core count and workers splits the cores over
+    the logs, so a single log still uses every core. Returns one result dict per log, in
+    order of logs; outputs that are already current (see RenderCache) are not rendered again.
+    """
+    cores = os.cpu_count() or 1
+    jobs = max(1, min(jobs or cores, len(logs)))
+    workers = workers or max(1, cores // jobs)
+    render_options = {**(render_options or {}), "workers": workers}
+
+    # Outputs are named after the log, so two logs with one name would overwrite each other
+    seen = {}
+    results = {}
+    for log in logs:
+        if log.stem in seen:
+            results[log] = {"log": str(log), "status": "failed", "error": f"Same output name as {seen[log.stem]}"}
+        else:
+            seen[log.stem] = log
+    todo = [log for log in logs if log not in results]
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(_render_log, log, hr_intervals, render_options): log for log in todo}
+
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            log_callback(f"[{len(results)}/{len(logs)}] {_describe(result)}")
+
+    return [results[log] for log in logs]
+
+
+def _describe(result):
+    name = Path(result["log"]).name
+    if result["status"] == "failed":
+        return f"❌ {name}: {result['error']}"
+    if result["status"] == "up-to-date":
+        return f"✔ {name}: up to date, {result['output']}"
+    return (
+        f"✔ {name}: {result['encoded_frames']}/{result['total_frames']} frames in "
+        f"{result['elapsed_seconds']:.1f} s = {result['fps']:.0f} fps, {result['output']}"
+    )
+
+
+def summarize(results, elapsed):
+    """Totals over the batch results, for the JSON summary."""
+    counts = {status: sum(r["status"] == status for r in results) for status in ("rendered", "up-to-date", "failed")}
+    encoded = sum(r.get("encoded_frames", 0) for r in results)
+    return {
+        "files": len(results),
+        **counts,
+        "encoded_frames": encoded,
+        "elapsed_seconds": elapsed,
+        "fps": encoded / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render heart rate logs to overlay videos without the GUI.")
+    parser.add_argument("inputs", nargs="*", default=[LOGS_DIR],
+                        help=f"log files, glob patterns or directories of logs (default {LOGS_DIR})")
+    parser.add_argument("--intervals", type=int, nargs=2, metavar=("LOW", "HIGH"),
+                        help="heart rate color intervals (default: the GUI's last setting)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="folder for the videos")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--scale", type=float, default=1.0, help="overlay size factor, e.g. 4 for 4K productions")
+    size.add_argument("--height", type=int, help=f"overlay height in pixels instead of --scale ({HEIGHT} at scale 1)")
+    parser.add_argument("--encoder", choices=list(ENCODERS), default=DEFAULT_ENCODER, help="output format")
+    parser.add_argument("--preset", help="encoder preset, see video_encoders.ENCODERS")
+    parser.add_argument("--threads", type=int, help="encoder threads per segment worker")
+    parser.add_argument("--interpolation", choices=["hold", "linear"], default=INTERPOLATION)
+    parser.add_argument("--gap-policy", choices=["freeze", "fade", "dashes"], default=GAP_POLICY)
+    parser.add_argument("--beat-source", choices=["synthetic", "rr"], default=BEAT_SOURCE)
+    parser.add_argument("--sparkline", action="store_true", help="add the scrolling heart rate history")
+    parser.add_argument("--clip-start", type=parse_time, metavar="TIME",
+                        help="render from this time into each log, in seconds or H:MM:SS")
+    clip_end = parser.add_mutually_exclusive_group()
+    clip_end.add_argument("--clip-end", type=parse_time, metavar="TIME", help="render up to this time into each log")
+    clip_end.add_argument("--clip-duration", type=parse_time, metavar="TIME", help="render this long from --clip-start")
+    parser.add_argument("--jobs", type=int, help="logs rendered at once (default: one per core)")
+    parser.add_argument("--workers", type=int, help="segment workers per log (default: cores / jobs)")
+    parser.add_argument("--force", action="store_true", help="render even when the output is up to date")
+    parser.add_argument("--summary", help="write the JSON summary to this file instead of stdout")
+    args = parser.parse_args()
+
+    logs = find_logs(args.inputs)
+    if not logs:
+        parser.error(f"no logs ({', '.join(LOG_SUFFIXES)}) in {' '.join(args.inputs)}")
+
+    hr_intervals = tuple(args.intervals) if args.intervals else load_color_intervals()
+    render_options = {
+        "output_dir": args.output_dir,
+        "scale": OverlayLayout.for_height(args.height).scale if args.height else args.scale,
+        "encoder": args.encoder,
+        "preset": args.preset,
+        "threads": args.threads,
+        "interpolation": args.interpolation,
+        "gap_policy": args.gap_policy,
+        "beat_source": args.beat_source,
+        "sparkline": args.sparkline,
+        "clip_start": args.clip_start,
+        "clip_end": args.clip_end,
+        "clip_duration": args.clip_duration,
+        "cache": not args.force,
+    }
+
+    # Progress goes to stderr so stdout stays machine-readable
+    start = time.perf_counter()
+    results = batch_render(logs, hr_intervals, args.jobs, args.workers, render_options,
+                           log_callback=lambda line: print(line, file=sys.stderr, flush=True))
+    summary = {
+        "hr_intervals": list(hr_intervals),
+        "render_options": render_options,
+        "total": summarize(results, time.perf_counter() - start),
+        "files": results,
+    }
+
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+
+    sys.exit(1 if summary["total"]["failed"] else 0)
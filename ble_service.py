@@ -0,0 +1,171 @@
+import asyncio
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class BleService(QThread):
+    """
+    One long-lived asyncio loop that records any number of heart rate straps at once.
+    Every session shares the same MonotonicClock and one LogWriterGroup task, and
+    devices are started and stopped individually without restarting the loop. Every
+    sample is also published on a SampleBus for other local processes.
+    """
+    log = pyqtSignal(str)
+    tick = pyqtSignal(str, str)  # device address, "BPM: ..." line, one per notification
+    connected = pyqtSignal(str)  # device address
+    reconnecting = pyqtSignal(str)  # device address, the connection dropped
+    device_finished = pyqtSignal(str)  # device address
+
+    def __init__(self, log_format: str = None, sample_callback=None):
+        super().__init__()
+        # The BLE stack (bleak, numpy) loads with the first recording, not with the GUI
+        from hr_recorder import LOG_FORMAT, MonotonicClock
+        from log_writer import LogWriterGroup
+
+        self.log_format = log_format or LOG_FORMAT
+        # sample_callback(address, hr, rr_ms, received_at) runs on the service thread
+        self.sample_callback = sample_callback
+        self.clock = MonotonicClock()
+        self.writers = LogWriterGroup(log_callback=self.log.emit)
+        self.sessions = {}  # address -> stop event, only touched on the loop thread
+        self.bus = None
+
+        self.loop = None
+        self.startup_error = None  # why the loop didn't start, raised again by the calls below
+        self._shutdown = None
+        self._ready = threading.Event()
+
+    # --- Called from any thread ---
+    def start_device(self, address: str):
+        self._call_soon(self._start_device, address)
+
+    def stop_device(self, address: str):
+        self._call_soon(self._stop_device, address)
+
+    def shutdown(self):
+        """Stops every device, closes their logs and ends the loop, if it ever started."""
+        self._ready.wait()
+        if self.startup_error is None:
+            self._call_soon(lambda: self._shutdown.set())
+
+    def _call_soon(self, callback, *args):
+        self._ready.wait()
+        if self.startup_error is not None:
+            raise RuntimeError(
+                f"BLE service failed to start: {type(self.startup_error).__name__}: {self.startup_error}"
+            ) from self.startup_error
+        if self.loop.is_closed():
+            raise RuntimeError("BLE service has stopped")
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    # --- Service thread ---
+    def run(self):
+        try:
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.loop.run_until_complete(self._main())
+            finally:
+                self.loop.close()
+        except Exception as e:
+            if self._ready.is_set():
+                raise
+            self.startup_error = e
+        finally:
+            # Callers wait for the loop, never leave them waiting on one that didn't start
+            self._ready.set()
+
+    async def _main(self):
+        import sqlite3
+        from hr_recorder import LOGS_DIR
+        from log_writer import recover_partial_logs
+        from sample_bus import BUS_NAME, SampleBus
+        from session_catalog import SessionCatalog
+
+        self._shutdown = asyncio.Event()
+        recover_partial_logs(LOGS_DIR, self.log.emit)
+
+        try:
+            # Opened on this thread, where the writer task uses it
+            self.writers.catalog = SessionCatalog()
+        except sqlite3.Error as e:
+            self.log.emit(f"⚠ Session catalog unavailable: {e}")
+
+        try:
+            self.bus = SampleBus()
+            self.log.emit(f"Publishing samples on shared memory {BUS_NAME} and tcp://{self.bus.host}:{self.bus.port}")
+        except OSError as e:
+            # Another instance has the port, recording works the same without the bus
+            self.log.emit(f"⚠ Sample bus unavailable: {e}")
+
+        writers_stop = asyncio.Event()
+        writers_task = asyncio.create_task(self.writers.run(writers_stop))
+        self._ready.set()
+
+        await self._shutdown.wait()
+
+        for stop_event in self.sessions.values():
+            stop_event.set()
+        sessions = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and t is not writers_task]
+        await asyncio.gather(*sessions, return_exceptions=True)
+
+        writers_stop.set()
+        await writers_task
+
+        if self.bus is not None:
+            self.bus.close()
+            self.bus = None
+        if self.writers.catalog is not None:
+            self.writers.catalog.close()
+            self.writers.catalog = None
+
+    def _start_device(self, address):
+        from hr_recorder import new_log_filename
+
+        if address in self.sessions:
+            return
+
+        # Straps started together would otherwise share a log name
+        tag = address.replace(":", "") if self.sessions else ""
+        stop_event = asyncio.Event()
+        self.sessions[address] = stop_event
+        self.loop.create_task(self._session(address, stop_event, new_log_filename(self.log_format, tag)))
+
+    def _stop_device(self, address):
+        stop_event = self.sessions.get(address)
+        if stop_event is not None:
+            stop_event.set()
+
+    async def _session(self, address, stop_event, filename):
+        from hr_recorder import BPM_TEXT, RECONNECTING_TEXT, record_heartrate
+
+        def log_callback(text):
+            if text.startswith(BPM_TEXT):
+                self.tick.emit(address, f"[{address}] {text}" if len(self.sessions) > 1 else text)
+                return
+            if text == "Connected to Polar H10":
+                self.connected.emit(address)
+            elif text.startswith(RECONNECTING_TEXT):
+                self.reconnecting.emit(address)
+            self.log.emit(f"[{address}] {text}" if len(self.sessions) > 1 else text)
+
+        def sample_callback(hr, rr_ms, received_at):
+            if self.bus is not None:
+                self.bus.publish(address, received_at, self.clock.at(received_at), hr, rr_ms)
+            if self.sample_callback is not None:
+                self.sample_callback(address, hr, rr_ms, received_at)
+
+        try:
+            await record_heartrate(
+                address,
+                stop_event,
+                log_callback=log_callback,
+                log_format=self.log_format,
+                sample_callback=sample_callback,
+                writers=self.writers,
+                clock=self.clock,
+                filename=filename,
+            )
+        finally:
+            del self.sessions[address]
+            self.device_finished.emit(address)
\ No newline at end of file
@@ -0,0 +1,44 @@
+import queue
+
+
+class BoundedClient:
+    """
+    Items queued for one consumer (a socket, a pipe, an HTTP stream), sent in order by a
+    thread of its own through run(). offer() never blocks the producer: a consumer more
+    than maxsize items behind is closed instead, so whatever it receives has no gaps.
+    """
+
+    def __init__(self, maxsize):
+        self.items = queue.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def offer(self, item):
+        try:
+            self.items.put_nowait(item)
+        except queue.Full:
+            # Too slow to keep up: drop the client rather than gaps in its stream
+            self.closed = True
+            self.dropped()
+
+    def dropped(self):
+        """Called once offer() has closed the client for falling behind."""
+
+    def run(self, send):
+        """Sender thread: send(item) for each item until the client is closed or send raises OSError."""
+        try:
+            while not self.closed:
+                item = self.items.get()
+                if item is None:
+                    break
+                send(item)
+        except OSError:
+            pass
+        finally:
+            self.closed = True
+
+    def close(self):
+        self.closed = True
+        try:
+            self.items.put_nowait(None)  # wakes an idle sender
+        except queue.Full:
+            pass
@@ -0,0 +1,139 @@
+import itertools
+import logging
+import time
+from collections import deque
+from PyQt5.QtCore import QTimer
+
+TICK = 15  # per-sample lines such as "BPM: 72", between logging.DEBUG and logging.INFO
+logging.addLevelName(TICK, "TICK")
+
+FLUSH_INTERVAL_MS = 100  # how often queued lines reach the console
+TICK_INTERVAL = 1.0  # seconds between console lines of one tick key, the latest one wins
+BUFFER_LINES = 4096  # lines queued between flushes before the oldest are dropped
+LOG_FILE_FLAG = "--log-file"
+
+
+class RingBuffer:
+    """
+    Bounded queue many threads append to without a lock (deque appends and pops are
+    atomic). Past capacity the oldest entries are dropped; drain() counts them.
+    """
+
+    def __init__(self, capacity=BUFFER_LINES):
+        self._entries = deque(maxlen=capacity)
+        self._sequence = itertools.count()  # next() is atomic, numbers the appended entries
+        self._next_sequence = 0  # first number not drained yet, lower ones were dropped
+
+    def append(self, entry):
+        self._entries.append((next(self._sequence), entry))
+
+    def drain(self):
+        """(entries appended since the last drain, how many of them were dropped)."""
+        entries = []
+        dropped = 0
+        while True:
+            try:
+                sequence, entry = self._entries.popleft()
+            except IndexError:
+                return entries, dropped
+            dropped += sequence - self._next_sequence
+            self._next_sequence = sequence + 1
+            entries.append(entry)
+
+
+class ConsoleLog:
+    """
+    Log sink for a QPlainTextEdit that any thread can write to at any rate. log() and
+    tick() only append to a RingBuffer; a QTimer on the GUI thread drains it every
+    flush_interval_ms and appends all new lines at once, so the GUI's cost depends on the
+    flush rate, not on how often anything is logged.
+
+    Lines below level are left out of the console. Ticks have a buffer of their own, so a
+    flood of them can't push out other lines, and collapse per key (e.g. one line per
+    strap) to the latest, shown at most every TICK_INTERVAL. The console itself keeps
+    max_lines blocks (setMaximumBlockCount). If file_path is set, every line at file_level
+    or above, ticks included, is appended there with a timestamp.
+    """
+
+    def __init__(self, console, max_lines, level=TICK, file_path=None, file_level=TICK,
+                 flush_interval_ms=FLUSH_INTERVAL_MS):
+        self.console = console
+        self.console.setMaximumBlockCount(max_lines)
+        self.level = level
+        self.file_level = file_level
+        self.file = open(file_path, "a", encoding="utf-8") if file_path else None
+
+        self._lines = RingBuffer()  # (time.time(), level, text)
+        self._ticks = RingBuffer()  # (time.time(), key, text)
+        self._latest_ticks = {}  # key -> text waiting for its TICK_INTERVAL
+        self._next_tick = {}  # key -> time.monotonic() its next tick may show
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.flush)
+        self.timer.start(flush_interval_ms)
+
+    @staticmethod
+    def file_path_from_argv(argv):
+        """The path after --log-file in argv (both removed), None without one."""
+        if LOG_FILE_FLAG not in argv:
+            return None
+        at = argv.index(LOG_FILE_FLAG)
+        path = argv[at + 1] if at + 1 < len(argv) else None
+        del argv[at:at + 2]
+        return path
+
+    # --- Any thread ---
+    def log(self, text: str, level: int = logging.INFO):
+        self._lines.append((time.time(), level, text))
+
+    def tick(self, key: str, text: str):
+        self._ticks.append((time.time(), key, text))
+
+    # --- GUI thread ---
+    def flush(self):
+        lines, dropped_lines = self._lines.drain()
+        ticks, dropped_ticks = self._ticks.drain()
+
+        if self.file is not None:
+            self._write_file(lines, ticks)
+
+        shown = [text for _, level, text in lines if level >= self.level]
+
+        if TICK >= self.level:
+            for _, key, text in ticks:
+                self._latest_ticks[key] = text
+
+            now = time.monotonic()
+            for key in [k for k in self._latest_ticks if now >= self._next_tick.get(k, 0.0)]:
+                shown.append(self._latest_ticks.pop(key))
+                self._next_tick[key] = now + TICK_INTERVAL
+
+        if dropped_lines or dropped_ticks:
+            shown.append(f"⚠ {dropped_lines + dropped_ticks} log lines dropped, logging faster than the console shows")
+
+        if shown:
+            self.console.appendPlainText("\n".join(shown))
+            scroll_bar = self.console.verticalScrollBar()
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    def _write_file(self, lines, ticks):
+        entries = [entry for entry in lines if entry[1] >= self.file_level]
+        if TICK >= self.file_level:
+            entries.extend((logged_at, TICK, text) for logged_at, _, text in ticks)
+        if not entries:
+            return
+
+        entries.sort(key=lambda entry: entry[0])
+        self.file.writelines(
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(logged_at))}.{int(logged_at % 1 * 1000):03d} "
+            f"{logging.getLevelName(level)} {text}\n"
+            for logged_at, level, text in entries
+        )
+        self.file.flush()
+
+    def close(self):
+        self.timer.stop()
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -1,17 +1,64 @@
 from PyQt5.QtCore import QThread, pyqtSignal
 import asyncio
-from bleak import BleakScanner
+
+HR_SERVICE_UUID = "0000180d-0000-1000-8000-00805f9b34fb"
+
+SCAN_TIMEOUT = 5.0  # seconds, unless every target address shows up sooner
+RSSI_REPORT_STEP = 10  # dB a known device must get closer by to be reported again
 
 class BleScanWorker(QThread):
+    """
+    Streams BLE devices as their advertisements arrive instead of after the whole scan.
+    Only heart rate sensors are reported unless heart_rate_only is False, each address once
+    (again only if its signal gets RSSI_REPORT_STEP dB stronger). The scan ends as soon as
+    every address in target_addresses has been seen.
+    """
     device_found = pyqtSignal(str)
+    target_found = pyqtSignal(str)  # address
     finished = pyqtSignal()
 
+    def __init__(self, target_addresses=(), heart_rate_only=True, timeout=SCAN_TIMEOUT):
+        super().__init__()
+        self.target_addresses = {a.upper() for a in target_addresses}
+        self.heart_rate_only = heart_rate_only
+        self.timeout = timeout
+        self.best_rssi = {}  # address -> strongest RSSI reported
+
     def run(self):
         asyncio.run(self.scan())
 
     async def scan(self):
-        devices = await BleakScanner.discover(timeout=5)
-        for d in devices:
-            name = d.name or "Unknown"
-            self.device_found.emit(f"{d.address} {name}")
-        self.finished.emit()
\ No newline at end of file
+        # bleak loads on the first scan, not with the GUI
+        from bleak import BleakScanner
+
+        all_found = asyncio.Event()
+        targets_left = set(self.target_addresses)
+
+        def on_detection(device, advertisement):
+            # Some backends ignore the scanner's service filter, check it here as well
+            if self.heart_rate_only and HR_SERVICE_UUID not in advertisement.service_uuids:
+                return
+
+            address = device.address.upper()
+            best = self.best_rssi.get(address)
+            if best is not None and advertisement.rssi < best + RSSI_REPORT_STEP:
+                return
+            self.best_rssi[address] = advertisement.rssi
+
+            name = device.name or advertisement.local_name or "Unknown"
+            self.device_found.emit(f"{device.address} {name} ({advertisement.rssi} dBm)")
+
+            if address in targets_left:
+                targets_left.discard(address)
+                self.target_found.emit(device.address)
+                if not targets_left:
+                    all_found.set()
+
+        service_uuids = [HR_SERVICE_UUID] if self.heart_rate_only else None
+        async with BleakScanner(detection_callback=on_detection, service_uuids=service_uuids):
+            try:
+                await asyncio.wait_for(all_found.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        self.finished.emit()
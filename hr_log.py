@@ -0,0 +1,480 @@
+import argparse
+import io
+import os
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# ============================================================
+# BINARY LOG FORMAT (.hrb)
+# ============================================================
+# A 16 byte header followed by fixed-width little-endian records.
+# timestamp_ms is UTC milliseconds since 1970-01-01 (time.time() * 1000), so it keeps
+# counting through a DST change. CSV logs hold naive local wall-clock times instead, which
+# convert_csv_log localizes (see localize_ms).
+BINARY_SUFFIX = ".hrb"
+CSV_SUFFIX = ".csv"
+CSV_HEADER = "timestamp,heart_rate,rr_intervals\n"  # rr_intervals: space separated ms, may be empty
+# A row with an empty heart_rate is a gap marker: the connection was lost at that time
+
+MAGIC = b"HRB1"
+VERSION = 2  # version 1 held naive local wall-clock ms and 4 RR intervals
+MAX_RR = 9  # RR intervals kept per record, what a notification carries in the default 23 byte MTU
+
+FLAG_GAP = 0x01  # record marks a lost connection, not a sample
+
+SEEK_BLOCK = 4096  # bytes read at a time when LogIndex looks for the row before an offset
+QUARTER_HOUR_MS = 15 * 60 * 1000  # UTC offsets change on a quarter hour of local time
+
+HEADER = struct.Struct("<4sHH8x")  # magic, version, record size
+RECORD = struct.Struct(f"<qHBB{MAX_RR}H")  # timestamp_ms, heart_rate, rr_count, flags, rr_ms
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp_ms", "<i8"),
+    ("heart_rate", "<u2"),
+    ("rr_count", "u1"),
+    ("flags", "u1"),
+    ("rr_ms", "<u2", (MAX_RR,)),
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+def binary_header():
+    return HEADER.pack(MAGIC, VERSION, RECORD.size)
+
+
+def pack_record(timestamp_ms, heart_rate, rr_ms=(), flags=0):
+    # The latest intervals: they end at the timestamp, see HeartRateLog.beat_seconds
+    rr_ms = tuple(rr_ms)[-MAX_RR:]
+    padded = rr_ms + (0,) * (MAX_RR - len(rr_ms))
+    return RECORD.pack(timestamp_ms, heart_rate, len(rr_ms), flags, *padded)
+
+
+def open_binary_log(path):
+    """Memory-maps the records of a .hrb log. A partially written last record is ignored."""
+    path = Path(path)
+    size = path.stat().st_size
+
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{path} is not a heart rate log: header is truncated")
+
+    magic, version, record_size = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a version {VERSION} heart rate log")
+
+    count = (size - HEADER.size) // record_size
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+
+
+# ============================================================
+# READING
+# ============================================================
+class HeartRateLog:
+    """
+    Columns of a heart rate log, whatever format it was stored in.
+    rr_ms holds up to MAX_RR intervals per sample, the first rr_count of each row are valid.
+    gap_timestamps_ms are the gap markers written when the connection dropped.
+    origin_ms is the log's first sample when this is only part of it (LogIndex.read_range),
+    so times still count from the start of the whole log.
+    """
+
+    def __init__(self, timestamps_ms, heart_rate, rr_ms=None, rr_count=None, gap_timestamps_ms=None,
+                 origin_ms=None):
+        self.timestamps_ms = timestamps_ms
+        self.heart_rate = heart_rate
+        self.rr_ms = rr_ms if rr_ms is not None else np.zeros((len(heart_rate), MAX_RR), dtype=np.uint16)
+        self.rr_count = rr_count if rr_count is not None else np.zeros(len(heart_rate), dtype=np.uint8)
+        self.gap_timestamps_ms = gap_timestamps_ms if gap_timestamps_ms is not None else np.empty(0, dtype=np.int64)
+        self.origin_ms = origin_ms
+
+    def __len__(self):
+        return len(self.heart_rate)
+
+    @property
+    def start_ms(self):
+        return self.origin_ms if self.origin_ms is not None else self.timestamps_ms.min()
+
+    @property
+    def seconds(self):
+        """Sample times in seconds from the earliest sample (of the whole log)."""
+        return (self.timestamps_ms - self.start_ms) / 1000.0
+
+    @property
+    def gap_seconds(self):
+        """Gap marker times in seconds from the earliest sample (of the whole log)."""
+        return (self.gap_timestamps_ms - self.start_ms) / 1000.0
+
+    @property
+    def has_rr(self):
+        return bool(self.rr_count.any())
+
+    def beat_seconds(self):
+        """
+        Sorted beat times in seconds from the earliest sample. A notification's RR intervals
+        end at its timestamp, so each beat lies the sum of the later intervals before it.
+        """
+        valid = np.arange(MAX_RR) < self.rr_count[:, None]
+        rr = np.where(valid, self.rr_ms, 0).astype(np.int64)
+        later = rr[:, ::-1].cumsum(axis=1)[:, ::-1] - rr
+
+        beats_ms = (self.timestamps_ms - self.start_ms)[:, None] - later
+        return np.sort(beats_ms[valid]) / 1000.0
+
+
+def _parse_rr_column(rr_column):
+    """Splits the space separated rr_intervals strings into a padded (n, MAX_RR) array."""
+    rr_ms = np.zeros((len(rr_column), MAX_RR), dtype=np.uint16)
+    split = rr_column.fillna("").str.split(expand=True)
+
+    if split.shape[1]:
+        values = split.apply(lambda col: col.astype(float)).to_numpy(copy=True)
+        counts = np.count_nonzero(~np.isnan(values), axis=1)
+        # Rows with more than MAX_RR keep the latest, as pack_record does
+        for row in np.flatnonzero(counts > MAX_RR):
+            values[row, :MAX_RR] = values[row, counts[row] - MAX_RR:counts[row]]
+        values = np.nan_to_num(values[:, :MAX_RR])
+        rr_ms[:, :values.shape[1]] = values
+
+    return rr_ms, np.count_nonzero(rr_ms, axis=1).astype(np.uint8)
+
+
+def read_csv_log(path, rr=True, utc=False):
+    """
+    Reads a CSV log from a path or a binary file object; rr=False skips the RR intervals.
+    Its timestamps are naive local wall-clock ms, or UTC ms with utc (see localize_ms).
+    """
+    import pandas as pd
+
+    if rr:
+        df = pd.read_csv(path, dtype={"rr_intervals": str})
+    else:
+        df = pd.read_csv(path, usecols=["timestamp", "heart_rate"])
+    timestamps = pd.to_datetime(df["timestamp"]).to_numpy().astype("datetime64[ms]").astype(np.int64)
+    if utc:
+        timestamps = localize_ms(timestamps)
+
+    is_gap = df["heart_rate"].isna().to_numpy()
+    df = df[~is_gap]
+
+    rr_ms = rr_count = None
+    if "rr_intervals" in df:
+        rr_ms, rr_count = _parse_rr_column(df["rr_intervals"])
+
+    return HeartRateLog(
+        timestamps[~is_gap],
+        df["heart_rate"].to_numpy(dtype=np.int16),
+        rr_ms,
+        rr_count,
+        timestamps[is_gap]
+    )
+
+
+def read_binary_log(path):
+    return _records_log(open_binary_log(path))
+
+
+def _records_log(records, origin_ms=None):
+    is_gap = (np.asarray(records["flags"]) & FLAG_GAP) != 0
+    samples = records[~is_gap]
+
+    return HeartRateLog(
+        np.asarray(samples["timestamp_ms"]),
+        np.asarray(samples["heart_rate"]).astype(np.int16),
+        np.asarray(samples["rr_ms"]),
+        np.minimum(np.asarray(samples["rr_count"]), MAX_RR),
+        np.asarray(records["timestamp_ms"][is_gap]),
+        origin_ms
+    )
+
+
+def read_hr_log(path):
+    """Reads a .csv or .hrb heart rate log. Only CSV logs need pandas."""
+    if Path(path).suffix.lower() == BINARY_SUFFIX:
+        return read_binary_log(path)
+    return read_csv_log(path)
+
+
+# ============================================================
+# SEEKING (TIMESTAMP INDEX)
+# ============================================================
+class LogIndex:
+    """
+    Reads a time range of a heart rate log without loading the rest. Logs are written in
+    time order, so the timestamps on disk are the index: a binary search over the records
+    of a .hrb log, or over the byte offsets of a CSV log reading the row at each, finds a
+    time in O(log n) small reads. Rows are addressed by position (record number or byte
+    offset of the row); a partially written last row is ignored.
+    first_ms and last_ms are the times of the first and last samples.
+
+    The order is checked on opening, which reads the timestamps once. A log that isn't in
+    time order (a CSV log written across a DST or NTP clock step) has no index: it is read
+    whole and sorted, as for a full render, and read_range takes its ranges from that.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.binary = self.path.suffix.lower() == BINARY_SUFFIX
+        self.file = None
+
+        if self.binary:
+            self.records = open_binary_log(path)
+            self.data_start, self.end = 0, len(self.records)
+        else:
+            self.file = open(path, "rb")
+            self.header = self.file.readline()
+            self.data_start = self.file.tell()
+            self.end = self._line_start_before(os.fstat(self.file.fileno()).st_size)
+
+        self.in_order = self._in_time_order()
+        self.sorted_log = None
+        if not self.in_order:
+            self.sorted_log = _sorted_log(read_hr_log(path))
+            if len(self.sorted_log):
+                self.first_ms = int(self.sorted_log.timestamps_ms[0])
+                self.last_ms = int(self.sorted_log.timestamps_ms[-1])
+                return
+
+        first = self._sample_from(self.data_start)
+        last = self._sample_before(self.end)
+        if first is None:
+            self.close()
+            raise ValueError(f"{self.path} has no samples")
+        self.first_ms, self.last_ms = first[1], last[1]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _in_time_order(self):
+        """Whether no row's timestamp is before the one of the row above it."""
+        if self.binary:
+            timestamps = self.records["timestamp_ms"]
+        else:
+            self.file.seek(self.data_start)
+            lines = self.file.read(self.end - self.data_start).splitlines()
+            timestamps = np.array([line.partition(b",")[0] for line in lines]).astype("datetime64[ms]")
+        return bool((timestamps[1:] >= timestamps[:-1]).all())
+
+    # --- Rows ---
+    def _row(self, pos):
+        """(timestamp_ms, is_sample, next position) of the row starting at pos."""
+        if self.binary:
+            record = self.records[pos]
+            return int(record["timestamp_ms"]), not record["flags"] & FLAG_GAP, pos + 1
+
+        self.file.seek(pos)
+        line = self.file.readline()
+        timestamp, _, rest = line.partition(b",")
+        heart_rate = rest.partition(b",")[0].strip()
+        return int(np.datetime64(timestamp.decode().strip(), "ms").astype(np.int64)), bool(heart_rate), self.file.tell()
+
+    def _row_start(self, pos):
+        """Position of the first row starting at or after pos."""
+        if self.binary or pos <= self.data_start:
+            return max(pos, self.data_start)
+        self.file.seek(pos - 1)
+        self.file.readline()
+        return min(self.file.tell(), self.end)
+
+    def _previous_row(self, pos):
+        """Position of the row before the one starting at pos."""
+        return pos - 1 if self.binary else self._line_start_before(pos - 1)
+
+    def _line_start_before(self, limit):
+        """Offset right after the last newline before limit, data_start if there is none."""
+        while limit > self.data_start:
+            chunk_start = max(self.data_start, limit - SEEK_BLOCK)
+            self.file.seek(chunk_start)
+            newline = self.file.read(limit - chunk_start).rfind(b"\n")
+            if newline >= 0:
+                return chunk_start + newline + 1
+            limit = chunk_start
+        return self.data_start
+
+    def _sample_from(self, pos):
+        """(position, timestamp_ms) of the first sample row at or after the row at pos, None if none."""
+        while pos < self.end:
+            timestamp_ms, is_sample, next_pos = self._row(pos)
+            if is_sample:
+                return pos, timestamp_ms
+            pos = next_pos
+        return None
+
+    def _sample_before(self, pos):
+        """(position, timestamp_ms) of the last sample row before the row at pos, None if none."""
+        while pos > self.data_start:
+            pos = self._previous_row(pos)
+            timestamp_ms, is_sample, _ = self._row(pos)
+            if is_sample:
+                return pos, timestamp_ms
+        return None
+
+    # --- Seeking ---
+    def seek(self, timestamp_ms):
+        """Position of the first row at or after timestamp_ms (the end if there is none)."""
+        if not self.in_order:
+            raise ValueError(f"{self.path} isn't in time order, it can't be seeked")
+        lo, hi = self.data_start, self.end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = self._row_start(mid)
+            if row < self.end and self._row(row)[0] < timestamp_ms:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self._row_start(lo)
+
+    def read(self, start, end, rr=True):
+        """The rows [start, end) as a HeartRateLog timed from the log's first sample."""
+        if self.binary:
+            return _records_log(self.records[start:end], self.first_ms)
+
+        self.file.seek(start)
+        log = read_csv_log(io.BytesIO(self.header + self.file.read(end - start)), rr)
+        log.origin_ms = self.first_ms
+        return log
+
+    def read_range(self, start_ms, end_ms, rr=True):
+        """
+        The rows from start_ms to end_ms, extended to everything a timeline over that range
+        depends on: back to the sample in effect at start_ms and on to the first sample at or
+        after end_ms, with every row sharing its timestamp.
+        """
+        if self.sorted_log is not None:
+            return _time_range(self.sorted_log, start_ms, end_ms)
+
+        previous = self._sample_before(self.seek(start_ms + 1))
+        start = previous[0] if previous is not None else self.data_start
+
+        following = self._sample_from(self.seek(end_ms))
+        end = self.seek(following[1] + 1) if following is not None else self.end
+        return self.read(start, end, rr)
+
+
+def _sorted_log(log):
+    """log with its samples and gap markers in time order."""
+    order = np.argsort(log.timestamps_ms, kind="stable")
+    return HeartRateLog(
+        log.timestamps_ms[order], log.heart_rate[order], log.rr_ms[order], log.rr_count[order],
+        np.sort(log.gap_timestamps_ms)
+    )
+
+
+def _time_range(log, start_ms, end_ms):
+    """LogIndex.read_range of a sorted log in memory."""
+    t = log.timestamps_ms
+    start = max(np.searchsorted(t, start_ms, side="right") - 1, 0)
+    following = np.searchsorted(t, end_ms, side="left")
+    end = np.searchsorted(t, t[following], side="right") if following < len(t) else len(t)
+
+    gaps = log.gap_timestamps_ms
+    gaps = gaps[(gaps >= t[start]) & (gaps <= t[end - 1])]
+    return HeartRateLog(
+        t[start:end], log.heart_rate[start:end], log.rr_ms[start:end], log.rr_count[start:end], gaps, t[0]
+    )
+
+
+# ============================================================
+# CSV -> BINARY CONVERSION
+# ============================================================
+def localize_ms(naive_ms):
+    """
+    UTC ms of naive local wall-clock ms (a CSV log's times) in the time zone of this
+    machine, in the order they were written. Once the clock has stepped back, a repeated
+    hour (the DST fall-back) is taken as its second occurrence, so a log recorded across
+    it stays in order.
+    """
+    utc_ms = np.empty(len(naive_ms), dtype=np.int64)
+    offsets = {}  # (quarter hour, fold) -> local - UTC ms
+    fold = 0
+    previous = None
+
+    for i, ms in enumerate(np.asarray(naive_ms, dtype=np.int64).tolist()):
+        if previous is not None and ms < previous:
+            fold = 1
+        previous = ms
+
+        quarter = ms - ms % QUARTER_HOUR_MS
+        offset = offsets.get((quarter, fold))
+        if offset is None:
+            local = datetime(1970, 1, 1) + timedelta(milliseconds=quarter)
+            offset = offsets[quarter, fold] = quarter - round(local.replace(fold=fold).timestamp() * 1000)
+        utc_ms[i] = ms - offset
+
+    return utc_ms
+
+
+def convert_csv_log(csv_path, overwrite=False):
+    """
+    Writes a .hrb copy next to csv_path and returns its path, or None if it already exists.
+    The CSV's local times are stored as UTC, as if recorded in this machine's time zone.
+    """
+    csv_path = Path(csv_path)
+    output_path = csv_path.with_suffix(BINARY_SUFFIX)
+    if output_path.exists() and not overwrite:
+        return None
+
+    log = read_csv_log(csv_path, utc=True)
+    records = np.zeros(len(log) + len(log.gap_timestamps_ms), dtype=RECORD_DTYPE)
+    samples, gaps = records[:len(log)], records[len(log):]
+
+    samples["timestamp_ms"] = log.timestamps_ms
+    samples["heart_rate"] = np.clip(log.heart_rate, 0, None)
+    samples["rr_count"] = log.rr_count
+    samples["rr_ms"] = log.rr_ms
+    gaps["timestamp_ms"] = log.gap_timestamps_ms
+    gaps["flags"] = FLAG_GAP
+
+    records = records[np.argsort(records["timestamp_ms"], kind="stable")]
+
+    tmp_path = output_path.with_suffix(BINARY_SUFFIX + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(binary_header())
+        f.write(records.tobytes())
+    os.replace(tmp_path, output_path)
+
+    return output_path
+
+
+def convert_csv_logs(paths, overwrite=False, log_callback=print):
+    """Converts every CSV log among paths (files or directories). Returns the written .hrb paths."""
+    written = []
+
+    for path in map(Path, paths):
+        csv_files = sorted(path.glob(f"*{CSV_SUFFIX}")) if path.is_dir() else [path]
+
+        for csv_file in csv_files:
+            try:
+                output_path = convert_csv_log(csv_file, overwrite)
+            except Exception as e:
+                log_callback(f"❌ {csv_file}: {e}")
+                continue
+
+            if output_path is not None:
+                log_callback(f"{csv_file} -> {output_path}")
+                written.append(output_path)
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert CSV heart rate logs to the binary .hrb format.")
+    parser.add_argument("paths", nargs="*", default=["heartrate_overlay/logs"], help="CSV files or folders")
+    parser.add_argument("--overwrite", action="store_true", help="replace existing .hrb files")
+    args = parser.parse_args()
+
+    convert_csv_logs(args.paths, args.overwrite)
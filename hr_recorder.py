@@ -1,40 +1,187 @@
 import asyncio
 import os
-from bleak import BleakClient
+import time
+from bleak import BleakClient, BleakScanner
+from bleak.exc import BleakError
 from datetime import datetime
 
+from hr_log import BINARY_SUFFIX, CSV_SUFFIX
+from hrm_parser import parse_heart_rate_measurement
+from log_writer import BufferedLogWriter, LogWriterGroup, recover_partial_logs
+
 HR_CHAR_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
 
+LOG_FORMAT = "csv"  # "csv" or "binary"
+LOGS_DIR = "heartrate_overlay/logs"
+
+SCAN_TIMEOUT = 10.0  # seconds to look for the strap before the first connect
+RECONNECT_BACKOFF_MIN = 0.5  # seconds before the first reconnect attempt, doubled on each failure
+RECONNECT_BACKOFF_MAX = 15.0
+RECONNECTING_TEXT = "⚠ Connection lost, reconnecting"
+BPM_TEXT = "BPM: "  # per-notification lines, which the GUI console samples
+
+
+class MonotonicClock:
+    """
+    Wall-clock timestamps advanced by one monotonic counter. Every device recorded with
+    the same clock shares a timeline that never jumps when the system time is adjusted.
+    """
+
+    def __init__(self):
+        self._wall_start = time.time()
+        self._monotonic_start = time.perf_counter()
+
+    def now(self) -> float:
+        return self.at(time.perf_counter())
+
+    def at(self, counter: float) -> float:
+        """The timestamp of a time.perf_counter() reading, e.g. a notification's."""
+        return self._wall_start + (counter - self._monotonic_start)
+
+
+def new_log_filename(log_format=LOG_FORMAT, tag=""):
+    suffix = BINARY_SUFFIX if log_format == "binary" else CSV_SUFFIX
+    tag = f" {tag}" if tag else ""
+    return f"{LOGS_DIR}/{datetime.now().strftime('%Y-%m-%d %H-%M-%S')}{tag}{suffix}"
+
+
+class ReconnectStats:
+    """Connection drops of one recording session and how long each took to recover."""
+
+    def __init__(self):
+        self.reconnect_latencies = []  # seconds from the drop to notifications flowing again
+        self.failed_attempts = 0
+
+    @property
+    def reconnects(self):
+        return len(self.reconnect_latencies)
+
+    @property
+    def downtime(self):
+        return sum(self.reconnect_latencies)
 
-async def record_heartrate(polar_address: str, stop_event: asyncio.Event, log_callback=print):
-    filename = f"heartrate_overlay/logs/{datetime.now().strftime('%Y-%m-%d %H-%M-%S')}.csv"
-    os.makedirs("heartrate_overlay/logs", exist_ok=True)
+    def summary(self):
+        if not self.reconnect_latencies:
+            return "no reconnects"
+        latencies = sorted(self.reconnect_latencies)
+        return (
+            f"{self.reconnects} reconnects, {self.downtime:.1f} s down in total, "
+            f"median {latencies[len(latencies) // 2]:.1f} s, worst {latencies[-1]:.1f} s, "
+            f"{self.failed_attempts} failed attempts"
+        )
 
+
+async def _wait(stop_event: asyncio.Event, seconds: float):
+    """Sleeps for seconds, returning early once stop_event is set."""
     try:
-        async with BleakClient(polar_address) as client:
-            log_callback("Connected to Polar H10")
+        await asyncio.wait_for(stop_event.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def record_heartrate(
+    polar_address: str,
+    stop_event: asyncio.Event,
+    log_callback=print,
+    log_format=LOG_FORMAT,
+    sample_callback=None,
+    writers: LogWriterGroup = None,
+    clock: MonotonicClock = None,
+    filename: str = None,
+):
+    """
+    Records heart rate notifications to a new log until stop_event is set.
+    sample_callback(hr, rr_ms, received_at) is called from the notification callback with
+    received_at from time.perf_counter(), so it must return quickly.
+    Sessions sharing a writers group and clock (see BleService) leave running the group's
+    task to the caller; without them the session runs its own.
+
+    A dropped connection is retried with exponential backoff until stop_event is set,
+    reusing the BLEDevice found on the first connect so no scan is needed. Samples keep
+    going to the same log, with a gap marker where the connection was lost.
+    """
+    filename = filename or new_log_filename(log_format)
+    os.makedirs(LOGS_DIR, exist_ok=True)
+
+    own_writers = writers is None
+    if own_writers:
+        recover_partial_logs(LOGS_DIR, log_callback)
+        writers = LogWriterGroup()
+    clock = clock or MonotonicClock()
+
+    writer = BufferedLogWriter(filename)
+    writers_stop = asyncio.Event()
+    writers_task = None
+
+    stats = ReconnectStats()
+    device = None
+    backoff = RECONNECT_BACKOFF_MIN
+    disconnected_at = None  # perf_counter of the drop being recovered from
+
+    def handle_hr(sender, data):
+        received_at = time.perf_counter()
+        hr_value, rr_ms, _, _ = parse_heart_rate_measurement(data)
+        if sample_callback is not None:
+            sample_callback(hr_value, rr_ms, received_at)
+        writer.append(clock.at(received_at), hr_value, rr_ms)
+        log_callback(f"{BPM_TEXT}{hr_value}")
+
+    try:
+        while not stop_event.is_set():
+            disconnected = asyncio.Event()
+            try:
+                if device is None:
+                    device = await BleakScanner.find_device_by_address(polar_address, timeout=SCAN_TIMEOUT)
+                    if device is None:
+                        raise BleakError(f"{polar_address} not found")
+
+                async with BleakClient(device, disconnected_callback=lambda _: disconnected.set()) as client:
+                    await client.start_notify(HR_CHAR_UUID, handle_hr)
+                    log_callback("Connected to Polar H10")
+                    backoff = RECONNECT_BACKOFF_MIN
+
+                    if writer not in writers.writers:
+                        writers.add(writer)
+                        if own_writers:
+                            writers_task = asyncio.create_task(writers.run(writers_stop))
+
+                    if disconnected_at is not None:
+                        stats.reconnect_latencies.append(time.perf_counter() - disconnected_at)
+                        disconnected_at = None
+                        log_callback(f"Reconnected in {stats.reconnect_latencies[-1]:.1f} s ({stats.summary()})")
 
-            with open(filename, "a") as f:
-                f.write("timestamp,heart_rate\n")
-                f.flush()
+                    # Run until stop is requested or the strap drops out
+                    while not stop_event.is_set() and not disconnected.is_set():
+                        await _wait(disconnected, 0.5)
 
-                def handle_hr(sender, data):
-                    hr_value = data[1]
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    line = f"{timestamp},{hr_value}"
-                    log_callback(f"BPM: {hr_value}")
+                    if not disconnected.is_set():
+                        await client.stop_notify(HR_CHAR_UUID)
 
-                    f.write(line + "\n")
-                    f.flush()
+            except Exception as e:
+                log_callback(f"❌ BLE error: {e}")
+                if disconnected_at is not None:
+                    stats.failed_attempts += 1
 
-                await client.start_notify(HR_CHAR_UUID, handle_hr)
+            if stop_event.is_set():
+                break
 
-                # Run until stop is requested
-                while not stop_event.is_set():
-                    await asyncio.sleep(0.5)
+            if writer not in writers.writers:
+                log_callback(f"Retrying in {backoff:.1f} s")  # never connected yet, nothing to mark
+            elif disconnected_at is None:
+                disconnected_at = time.perf_counter()
+                writer.append_gap(clock.now())
+                log_callback(f"{RECONNECTING_TEXT} in {backoff:.1f} s")
 
-                await client.stop_notify(HR_CHAR_UUID)
-                log_callback(f"Saved to {filename}")
+            await _wait(stop_event, backoff)
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
 
-    except Exception as e:
-        log_callback(f"❌ BLE error: {e}")
\ No newline at end of file
+    finally:
+        if stats.reconnects or stats.failed_attempts:
+            log_callback(f"Connection stats: {stats.summary()}")
+        # Closing drains the queue and moves the .part file into place
+        if writer in writers.writers:
+            await writers.remove(writer)
+            log_callback(f"Saved to {filename}")
+        writers_stop.set()
+        if writers_task is not None:
+            await writers_task
@@ -0,0 +1,56 @@
+import struct
+from functools import lru_cache
+
+# ============================================================
+# HEART RATE MEASUREMENT (0x2A37) PARSING
+# ============================================================
+# Flags byte, Bluetooth Heart Rate Service specification
+FLAG_HR_UINT16 = 0x01
+FLAG_CONTACT_DETECTED = 0x02
+FLAG_CONTACT_SUPPORTED = 0x04
+FLAG_ENERGY_EXPENDED = 0x08
+FLAG_RR_INTERVALS = 0x10
+
+RR_UNITS_PER_SECOND = 1024
+
+_UINT16 = struct.Struct("<H")
+
+
+@lru_cache(maxsize=None)
+def _rr_struct(count):
+    return struct.Struct(f"<{count}H")
+
+
+def parse_heart_rate_measurement(data):
+    """
+    Decodes a Heart Rate Measurement notification.
+    Returns (heart_rate, rr_ms, energy_expended, contact): rr_ms is a tuple of RR intervals in
+    milliseconds, energy_expended is in kJ or None, contact is None if the sensor can't tell.
+    """
+    flags = data[0]
+
+    if flags & FLAG_HR_UINT16:
+        heart_rate = _UINT16.unpack_from(data, 1)[0]
+        offset = 3
+    else:
+        heart_rate = data[1]
+        offset = 2
+
+    energy_expended = None
+    if flags & FLAG_ENERGY_EXPENDED:
+        energy_expended = _UINT16.unpack_from(data, offset)[0]
+        offset += 2
+
+    rr_ms = ()
+    if flags & FLAG_RR_INTERVALS:
+        count = (len(data) - offset) // 2
+        rr_ms = tuple(
+            (rr * 1000 + RR_UNITS_PER_SECOND // 2) // RR_UNITS_PER_SECOND
+            for rr in _rr_struct(count).unpack_from(data, offset)
+        )
+
+    contact = None
+    if flags & FLAG_CONTACT_SUPPORTED:
+        contact = bool(flags & FLAG_CONTACT_DETECTED)
+
+    return heart_rate, rr_ms, energy_expended, contact
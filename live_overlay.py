@@ -0,0 +1,345 @@
+import io
+import os
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import Listener
+
+import numpy as np
+from PIL import Image
+
+from client_queue import BoundedClient
+from video_renderer import (
+    FPS, GAP_SECONDS, HEIGHT, NO_READING, WIDTH, MIN_HR,
+    FrameCache, OverlayAssets, heartbeat_track,
+)
+
+# ============================================================
+# CONFIG
+# ============================================================
+if sys.platform == "win32":
+    PIPE_ADDRESS = r"\\.\pipe\heartrate_overlay"
+    PIPE_FAMILY = "AF_PIPE"
+else:
+    PIPE_ADDRESS = "/tmp/heartrate_overlay.sock"
+    PIPE_FAMILY = "AF_UNIX"
+
+HTTP_HOST = "127.0.0.1"
+HTTP_PORT = 8765
+
+CLIENT_QUEUE_FRAMES = 2 * FPS  # a client further behind than this is disconnected, never skipped
+LATENCY_BUDGET_MS = 50.0  # notification -> frame on the wire
+STATS_INTERVAL = 10.0  # seconds between latency reports
+MAX_CATCH_UP = 1.0  # seconds behind schedule before the clock is reset instead of caught up
+FRAME_CACHE_BYTES = 32 * 1024 * 1024  # rendered (hr, heart_idx) frames kept, ~270 of them
+
+# Pipe frames: this header followed by WIDTH * HEIGHT * 4 bytes of RGBA
+FRAME_HEADER = struct.Struct("<QdHH")  # frame index, render time (perf_counter), width, height
+
+
+# ============================================================
+# LATENCY STATS
+# ============================================================
+class LatencyStats:
+    """Notification-to-wire latencies of the most recent samples, shared by all sink threads."""
+
+    def __init__(self, window=1000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.frames_sent = 0
+        self.late_frames = 0
+        self.disconnects = 0
+
+    def record_sent(self, latency=None):
+        with self._lock:
+            self.frames_sent += 1
+            if latency is not None:
+                self._latencies.append(latency)
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000.0
+        if len(latencies) == 0:
+            return None
+        return {
+            "samples": len(latencies),
+            "mean_ms": float(latencies.mean()),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "max_ms": float(latencies.max()),
+            "budget_ms": LATENCY_BUDGET_MS,
+            "frames_sent": self.frames_sent,
+            "late_frames": self.late_frames,
+            "disconnects": self.disconnects,
+        }
+
+
+class LiveFrame:
+    def __init__(self, index, rgba, sample_id, sample_received_at):
+        self.index = index
+        self.rgba = rgba
+        self.rendered_at = time.perf_counter()
+        self.sample_id = sample_id
+        self.sample_received_at = sample_received_at
+        self._png = None
+        self._png_lock = threading.Lock()
+
+    @property
+    def png(self):
+        # Encoded once, on first use, for however many HTTP clients there are
+        with self._png_lock:
+            if self._png is None:
+                buffer = io.BytesIO()
+                Image.frombuffer("RGBA", (WIDTH, HEIGHT), self.rgba).save(buffer, "PNG", compress_level=1)
+                self._png = buffer.getvalue()
+        return self._png
+
+
+# ============================================================
+# SINKS
+# ============================================================
+class _Client(BoundedClient):
+    """Frames queued for one consumer, with the latency of each sent frame recorded in stats."""
+
+    def __init__(self, stats):
+        super().__init__(CLIENT_QUEUE_FRAMES)
+        self.stats = stats
+        self._last_sample_id = None
+
+    def dropped(self):
+        self.stats.disconnects += 1
+
+    def sent(self, frame):
+        latency = None
+        if frame.sample_id != self._last_sample_id and frame.sample_received_at is not None:
+            latency = time.perf_counter() - frame.sample_received_at
+        self._last_sample_id = frame.sample_id
+        self.stats.record_sent(latency)
+
+
+class PipeSink:
+    """Raw RGBA frames on a named pipe (Windows) or Unix socket, one message per frame."""
+
+    def __init__(self, stats, address=PIPE_ADDRESS, family=PIPE_FAMILY):
+        self.stats = stats
+        if family == "AF_UNIX" and os.path.exists(address):
+            os.unlink(address)  # left behind by a previous run
+        self.listener = Listener(address, family)
+        self.clients = []
+        self._lock = threading.Lock()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                return
+            client = _Client(self.stats)
+            with self._lock:
+                self.clients.append(client)
+            threading.Thread(target=self._send, args=(client, connection), daemon=True).start()
+
+    def _send(self, client, connection):
+        def send(frame):
+            header = FRAME_HEADER.pack(frame.index, frame.rendered_at, WIDTH, HEIGHT)
+            connection.send_bytes(header + frame.rgba)
+            client.sent(frame)
+
+        try:
+            client.run(send)
+        finally:
+            connection.close()
+
+    def publish(self, frame):
+        with self._lock:
+            self.clients = [c for c in self.clients if not c.closed]
+            clients = list(self.clients)
+        for client in clients:
+            client.offer(frame)
+
+    def close(self):
+        with self._lock:
+            for client in self.clients:
+                client.close()
+        self.listener.close()
+
+
+class HttpSink:
+    """
+    Local HTTP endpoint: /stream is a multipart PNG stream (keeps the alpha channel),
+    /frame.png the latest frame.
+    """
+
+    def __init__(self, stats, host=HTTP_HOST, port=HTTP_PORT):
+        self.stats = stats
+        self.clients = []
+        self.latest = None
+        self._lock = threading.Lock()
+
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/frame.png" and sink.latest is not None:
+                    self._send_png(sink.latest.png)
+                elif self.path == "/stream":
+                    self._stream()
+                else:
+                    self.send_error(404)
+
+            def _send_png(self, png):
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(png)))
+                self.end_headers()
+                self.wfile.write(png)
+
+            def _stream(self):
+                client = _Client(sink.stats)
+                with sink._lock:
+                    sink.clients.append(client)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+
+                def send(frame):
+                    png = frame.png
+                    self.wfile.write(
+                        b"--frame\r\nContent-Type: image/png\r\n"
+                        + f"Content-Length: {len(png)}\r\n\r\n".encode()
+                        + png + b"\r\n"
+                    )
+                    self.wfile.flush()
+                    client.sent(frame)
+
+                client.run(send)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def publish(self, frame):
+        self.latest = frame
+        with self._lock:
+            self.clients = [c for c in self.clients if not c.closed]
+            clients = list(self.clients)
+        for client in clients:
+            client.offer(frame)
+
+    def close(self):
+        with self._lock:
+            for client in self.clients:
+                client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ============================================================
+# LIVE OVERLAY
+# ============================================================
+class LiveOverlay:
+    """
+    Renders the overlay continuously at FPS from the most recent heart rate sample.
+    push_sample() is cheap and thread-safe, so it can be called from the BLE callback.
+    """
+
+    def __init__(self, hr_interval_1, hr_interval_2, sinks=None, log_callback=print):
+        self.assets = OverlayAssets(hr_interval_1, hr_interval_2)
+        self.stats = LatencyStats()
+        self.sinks = sinks if sinks is not None else [PipeSink(self.stats), HttpSink(self.stats)]
+        self.log_callback = log_callback
+
+        self._latest = None  # (sample_id, hr, received_at), replaced as a whole
+        self._frames = FrameCache(FRAME_CACHE_BYTES)
+
+        self.smoothed_hr = None
+        self.beat_phase = 0.0
+
+    def push_sample(self, hr, received_at=None):
+        """Makes hr the displayed value. received_at is the notification's time.perf_counter()."""
+        sample_id = self._latest[0] + 1 if self._latest else 0
+        self._latest = (sample_id, hr, received_at if received_at is not None else time.perf_counter())
+
+    def _frame_state(self, now):
+        latest = self._latest
+        if latest is None or now - latest[2] > GAP_SECONDS:
+            shown_hr = NO_READING
+        else:
+            shown_hr = max(latest[1], MIN_HR)
+
+        target_hr = latest[1] if latest else MIN_HR
+        _, heart_idx, smoothed, phase = heartbeat_track(
+            [max(target_hr, MIN_HR)], 1.0 / FPS, self.smoothed_hr, self.beat_phase
+        )
+        self.smoothed_hr, self.beat_phase = smoothed[-1], phase[-1]
+
+        return latest, shown_hr, int(heart_idx[-1])
+
+    def render(self, frame_idx):
+        now = time.perf_counter()
+        latest, shown_hr, heart_idx = self._frame_state(now)
+
+        key = (shown_hr, heart_idx)
+        rgba = self._frames.get(key)
+        if rgba is None:
+            rgba = self.assets.make_frame(shown_hr, heart_idx).tobytes()
+            self._frames.put(key, rgba, len(rgba))
+
+        sample_id, received_at = (latest[0], latest[2]) if latest else (None, None)
+        return LiveFrame(frame_idx, rgba, sample_id, received_at)
+
+    def run(self, stop_event: threading.Event):
+        """Renders and publishes frames on a fixed FPS schedule until stop_event is set."""
+        period = 1.0 / FPS
+        next_tick = time.perf_counter()
+        next_report = next_tick + STATS_INTERVAL
+        frame_idx = 0
+
+        try:
+            while not stop_event.is_set():
+                now = time.perf_counter()
+                if now < next_tick:
+                    stop_event.wait(next_tick - now)
+                    continue
+
+                if now - next_tick > MAX_CATCH_UP:
+                    # Stalled (e.g. the machine slept), restart the schedule from now
+                    next_tick = now
+                elif now - next_tick > period:
+                    self.stats.late_frames += 1
+
+                frame = self.render(frame_idx)
+                for sink in self.sinks:
+                    sink.publish(frame)
+
+                frame_idx += 1
+                next_tick += period
+
+                if now >= next_report:
+                    self._report()
+                    next_report = now + STATS_INTERVAL
+        finally:
+            for sink in self.sinks:
+                sink.close()
+            self._report()
+
+    def _report(self):
+        summary = self.stats.summary()
+        if summary is None:
+            return
+
+        over = " ⚠ over budget" if summary["p95_ms"] > LATENCY_BUDGET_MS else ""
+        self.log_callback(
+            f"Live latency: mean {summary['mean_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, "
+            f"max {summary['max_ms']:.1f} ms (budget {LATENCY_BUDGET_MS:.0f} ms){over}; "
+            f"{summary['frames_sent']} frames sent, {summary['late_frames']} late, "
+            f"{summary['disconnects']} slow clients dropped"
+        )
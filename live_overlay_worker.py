@@ -0,0 +1,36 @@
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+
+class LiveOverlayWorker(QThread):
+    log = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+    def __init__(self, hr_interval_1: int, hr_interval_2: int):
+        super().__init__()
+        self.hr_interval_1 = hr_interval_1
+        self.hr_interval_2 = hr_interval_2
+        self.overlay = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            # Loads the render stack on first use, not with the GUI
+            from live_overlay import HTTP_HOST, HTTP_PORT, LiveOverlay
+
+            self.overlay = LiveOverlay(
+                self.hr_interval_1,
+                self.hr_interval_2,
+                log_callback=self.log.emit
+            )
+            self.log.emit(f"▶ Live overlay on http://{HTTP_HOST}:{HTTP_PORT}/stream")
+            self.overlay.run(self._stop_event)
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def push_sample(self, hr: int, rr_ms, received_at: float):
+        # Called from the recorder thread, LiveOverlay.push_sample is thread-safe
+        if self.overlay is not None:
+            self.overlay.push_sample(hr, received_at)
+
+    def stop(self):
+        self._stop_event.set()
\ No newline at end of file
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import sqlite3
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from hr_log import BINARY_SUFFIX, CSV_HEADER, FLAG_GAP, HEADER, RECORD, binary_header, pack_record
+from session_catalog import SessionStats
+
+FLUSH_INTERVAL = 1.0  # seconds between batched writes
+FSYNC_INTERVAL = 5.0  # seconds between fsyncs, the most a crash can lose
+PART_SUFFIX = ".part"
+
+
+def wall_clock_ms(now: datetime) -> int:
+    """Milliseconds since 1970-01-01 on the naive local wall clock, the time CSV rows hold."""
+    return int((now - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+class BufferedLogWriter:
+    """
+    Batches heart rate samples to a log file, flushed by a LogWriterGroup task.
+
+    append() only queues the sample, so it is safe to call from the BLE notification
+    callback. While recording, data goes to "<path>.part"; it is fsynced every
+    fsync interval and renamed to path on close. A crash therefore loses at most the
+    last interval, and recover_partial_logs() finalizes the leftover .part file.
+    stats follows what has been written, for the SessionCatalog.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.part_path = self.path.with_name(self.path.name + PART_SUFFIX)
+        self.binary = self.path.suffix.lower() == BINARY_SUFFIX
+
+        self.samples_written = 0
+        self.unsynced = False
+        self.stats = SessionStats()
+        self._pending = deque()
+        self._file = None
+        self._io_lock = asyncio.Lock()  # a close must not race an fsync in flight
+
+    def append(self, timestamp: float, heart_rate: int, rr_ms=()):
+        """Queues one sample taken at timestamp (time.time() seconds) with its RR intervals in ms."""
+        self._pending.append((timestamp, heart_rate, rr_ms))
+
+    def append_gap(self, timestamp: float):
+        """Queues a gap marker: the connection was lost at timestamp."""
+        self._pending.append((timestamp, None, ()))
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.part_path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(binary_header() if self.binary else CSV_HEADER.encode())
+            self._file.flush()
+
+    def _stored_ms(self, timestamp):
+        """
+        The timestamp reading the log back gives: UTC ms in .hrb, naive local time in CSV
+        rows, which keep whole seconds.
+        """
+        if self.binary:
+            return round(timestamp * 1000)
+        return wall_clock_ms(datetime.fromtimestamp(timestamp).replace(microsecond=0))
+
+    def _encode(self, timestamp, heart_rate, rr_ms):
+        if self.binary:
+            if heart_rate is None:
+                return pack_record(round(timestamp * 1000), 0, flags=FLAG_GAP)
+            return pack_record(round(timestamp * 1000), heart_rate, rr_ms)
+        now = datetime.fromtimestamp(timestamp)
+        if heart_rate is None:
+            return f"{now.strftime('%Y-%m-%d %H:%M:%S')},,\n".encode()
+        rr_text = " ".join(map(str, rr_ms))
+        return f"{now.strftime('%Y-%m-%d %H:%M:%S')},{heart_rate},{rr_text}\n".encode()
+
+    def flush(self):
+        """Writes every queued sample in one call. Returns the number written."""
+        batch = []
+        while self._pending:
+            timestamp, heart_rate, rr_ms = self._pending.popleft()
+            batch.append(self._encode(timestamp, heart_rate, rr_ms))
+
+            if heart_rate is None:
+                self.stats.add_gap(self._stored_ms(timestamp))
+            else:
+                self.stats.add(self._stored_ms(timestamp), heart_rate)
+
+        if batch:
+            self._file.write(b"".join(batch))
+            self._file.flush()
+            self.samples_written += len(batch)
+            self.unsynced = True
+        return len(batch)
+
+    async def sync(self):
+        async with self._io_lock:
+            if self._file is None:
+                return
+            # fsync can stall for a while on slow disks, keep it off the event loop
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+            self.unsynced = False
+
+    async def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        await self.sync()
+
+        async with self._io_lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            os.replace(self.part_path, self.path)
+
+
+class LogWriterGroup:
+    """
+    One writer task for any number of logs: every flush_interval it writes each log's
+    queued batch, and every fsync_interval it fsyncs the logs that changed. With a
+    catalog (a SessionCatalog opened on the writer task's thread) each fsync also
+    updates the logs' stats, and closing a log stores its final ones.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, fsync_interval=FSYNC_INTERVAL, log_callback=print):
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.log_callback = log_callback
+        self.writers = []
+        self.catalog = None
+
+    def add(self, writer: BufferedLogWriter):
+        writer.open()
+        self.writers.append(writer)
+
+    async def remove(self, writer: BufferedLogWriter):
+        """Stops flushing writer and closes its log."""
+        if writer in self.writers:
+            self.writers.remove(writer)
+        await writer.close()
+        self._update_catalog(writer, complete=True)
+
+    def _update_catalog(self, writer, complete):
+        if self.catalog is None or not writer.stats.samples:
+            return
+        try:
+            self.catalog.update(writer.path, writer.stats, complete)
+        except sqlite3.Error as e:
+            # Only an index, the recording goes on without it
+            self.log_callback(f"⚠ Session catalog not updated: {e}")
+
+    async def run(self, stop_event: asyncio.Event):
+        """Writer task: flushes batches until stop_event is set, then closes every log."""
+        loop = asyncio.get_running_loop()
+        last_sync = loop.time()
+
+        try:
+            while not stop_event.is_set():
+                try:
+                    await asyncio.wait_for(stop_event.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                for writer in list(self.writers):
+                    writer.flush()
+
+                if loop.time() - last_sync >= self.fsync_interval:
+                    for writer in [w for w in self.writers if w.unsynced]:
+                        await writer.sync()
+                        self._update_catalog(writer, complete=False)
+                    last_sync = loop.time()
+        finally:
+            for writer in list(self.writers):
+                await self.remove(writer)
+
+
+def recover_partial_logs(directory, log_callback=print):
+    """Finalizes .part logs left by a crash, dropping a torn last line or record."""
+    recovered = []
+
+    for part_path in sorted(Path(directory).glob(f"*{PART_SUFFIX}")):
+        path = part_path.with_name(part_path.name[:-len(PART_SUFFIX)])
+        data = part_path.read_bytes()
+
+        if path.suffix.lower() == BINARY_SUFFIX:
+            records = max(0, len(data) - HEADER.size) // RECORD.size
+            keep = min(len(data), HEADER.size + records * RECORD.size)
+        else:
+            keep = data.rfind(b"\n") + 1
+
+        with open(part_path, "r+b") as f:
+            f.truncate(keep)
+        os.replace(part_path, path)
+
+        log_callback(f"Recovered unfinished log {path}")
+        recovered.append(path)
+
+    return recovered
@@ -1,16 +1,27 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QHBoxLayout, QPlainTextEdit, QApplication, QLineEdit, QFileDialog
+import sys
+from startup_timer import StartupTimer
+
+# Before the other imports so --startup-report can time them
+startup_timer = StartupTimer.from_argv(sys.argv)
+
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QHBoxLayout, QPlainTextEdit, QApplication, QLineEdit
 from PyQt5.QtGui import QFont, QIcon, QPixmap, QPainter, QColor
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWinExtras import QWinTaskbarButton
 import keyboard
-import sys
+import logging
+import multiprocessing
 import os
 
 from device_finder import BleScanWorker
-from hr_worker import HRRecorderWorker
+from ble_service import BleService
 from video_render_worker import VideoRenderWorker
+from live_overlay_worker import LiveOverlayWorker
 from custom_slider import QRangeSlider
+from console_log import ConsoleLog
 
 MAX_LINES = 200  # max stored lines in console
+RENDER_LOG_INTERVAL = 10.0  # seconds between render progress lines in the console
 
 def ensure_file_exists(file_path: str):
     """Ensures the file exists. If it doesn't, creates an empty file. Assumes the directory already exists."""
@@ -26,7 +37,7 @@ ensure_file_exists("heartrate_overlay/config/color_intervals.txt")
 ensure_file_exists("heartrate_overlay/config/device_address.txt")
 
 class MainWindow(QWidget):
-    def __init__(self):
+    def __init__(self, log_file=None):
         super().__init__()
 
         # --- Window ---
@@ -41,6 +52,7 @@ class MainWindow(QWidget):
         self.console.setStyleSheet("background-color: rgb(40, 40, 40); color: white;")
         self.console.setFont(QFont("Consolas", 10))
         main_layout.addWidget(self.console, stretch=1)
+        self.console_log = ConsoleLog(self.console, MAX_LINES, file_path=log_file)
 
         # --- Button Panel ---
         button_layout = QVBoxLayout()
@@ -67,6 +79,8 @@ class MainWindow(QWidget):
         self.button_one.clicked.connect(self.toggle_recording)
         button_layout.addWidget(self.button_one)
         self.is_recording = False
+        self.ble_service = None
+        self.recording_addresses = []
         keyboard.add_hotkey("f7", self.toggle_recording)
 
         interval_1, interval_2 = self.load_color_intervals()
@@ -85,8 +99,16 @@ class MainWindow(QWidget):
 
         self.button_two = QPushButton("Generate Video")
         self.button_two.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-        self.button_two.clicked.connect(self.generate_video)
+        self.button_two.clicked.connect(self.toggle_render)
         button_layout.addWidget(self.button_two)
+        self.render_worker = None
+        self.rendering = False
+
+        self.live_button = QPushButton("Start Live Overlay")
+        self.live_button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
+        self.live_button.clicked.connect(self.toggle_live_overlay)
+        button_layout.addWidget(self.live_button)
+        self.live_worker = None
 
         button_layout.addStretch()  # Push everything above up
 
@@ -108,32 +130,24 @@ class MainWindow(QWidget):
 
         
 
-    # --- Fast, safe console logging ---
-    def announce(self, text: str):
-        self.console.appendPlainText(text)
-
-        # Enforce max line count
-        doc = self.console.document()
-        while doc.blockCount() > MAX_LINES:
-            cursor = self.console.textCursor()
-            cursor.movePosition(cursor.Start)
-            cursor.select(cursor.LineUnderCursor)
-            cursor.removeSelectedText()
-            cursor.deleteChar()
-
-        # Auto-scroll
-        self.console.verticalScrollBar().setValue(
-            self.console.verticalScrollBar().maximum()
-        )
+    # --- Console logging, batched by ConsoleLog ---
+    def announce(self, text: str, level: int = logging.INFO):
+        self.console_log.log(text, level)
 
     def find_devices(self):
         self.announce("Scanning for BLE devices...")
         self.device_button.setEnabled(False)
 
-        self.worker = BleScanWorker()
+        # Stops as soon as the configured straps advertise
+        addresses = self.text_input.text().replace(",", " ").split()
+        self.worker = BleScanWorker(addresses)
         self.worker.device_found.connect(self.announce)
+        self.worker.target_found.connect(self.on_scan_target_found)
         self.worker.finished.connect(self.on_scan_finished)
         self.worker.start()
+
+    def on_scan_target_found(self, address: str):
+        self.announce(f"✔ {address} is in range")
     
     def on_scan_finished(self):
         self.announce("Scan complete.")
@@ -154,10 +168,11 @@ class MainWindow(QWidget):
             self.stop_recording()
 
     def start_recording(self):
-        address = self.text_input.text().strip()
+        # Several straps can be recorded at once: separate addresses with commas or spaces
+        addresses = self.text_input.text().replace(",", " ").split()
 
-        if not address:
-            self.announce("❌ No device address set")
+        if not addresses:
+            self.announce("❌ No device address set", logging.WARNING)
             return
 
         self.announce("▶ Starting heart rate recording...")
@@ -165,75 +180,191 @@ class MainWindow(QWidget):
         self.is_recording = True
 
         self.taskbar_button.setOverlayIcon(self.overlay_dot_connecting)
-        
-        self.hr_worker = HRRecorderWorker(address)
-        self.hr_worker.log.connect(self.announce)
-        self.hr_worker.finished.connect(self.on_recording_finished)
-        self.hr_worker.connected.connect(self.on_hr_connected)
-        self.hr_worker.start()
 
-    def on_hr_connected(self):
+        if self.ble_service is None:
+            self.ble_service = BleService(sample_callback=self.on_hr_sample)
+            self.ble_service.log.connect(self.announce)
+            # Straight into the ring buffer from the BLE thread, not one GUI event per notification
+            self.ble_service.tick.connect(self.console_log.tick, Qt.DirectConnection)
+            self.ble_service.connected.connect(self.on_hr_connected)
+            self.ble_service.reconnecting.connect(self.on_hr_reconnecting)
+            self.ble_service.device_finished.connect(self.on_device_finished)
+            self.ble_service.start()
+
+        self.recording_addresses = addresses
+        try:
+            for address in addresses:
+                self.ble_service.start_device(address)
+        except RuntimeError as e:
+            self.on_ble_failed(e)
+
+    def on_hr_sample(self, address, hr, rr_ms, received_at):
+        # Runs on the BLE service thread, straight from the notification callback
+        live_worker = self.live_worker
+        addresses = self.recording_addresses
+        if live_worker is not None and addresses and address == addresses[0]:
+            live_worker.push_sample(hr, rr_ms, received_at)
+
+    def on_hr_connected(self, address: str):
         self.taskbar_button.setOverlayIcon(self.overlay_dot_recording)
+
+    def on_hr_reconnecting(self, address: str):
+        self.taskbar_button.setOverlayIcon(self.overlay_dot_connecting)
         
     def stop_recording(self):
-        if self.hr_worker:
+        if self.recording_addresses:
             self.announce("■ Stopping recording...")
-            self.hr_worker.stop()
+            try:
+                for address in self.recording_addresses:
+                    self.ble_service.stop_device(address)
+            except RuntimeError as e:
+                self.on_ble_failed(e)
+
+    def on_device_finished(self, address: str):
+        if address in self.recording_addresses:
+            self.recording_addresses.remove(address)
+        if not self.recording_addresses:
+            self.on_recording_finished()
 
     def on_recording_finished(self):
         self.button_one.setText("Record Heartrate (F7)")
         self.is_recording = False
-        self.hr_worker = None
         self.taskbar_button.clearOverlayIcon()
 
-    def generate_video(self):
-        logs_dir = "heartrate_overlay/logs"
+    def on_ble_failed(self, error):
+        """The BLE service's loop didn't start or has died: its recordings are over."""
+        self.announce(f"❌ {error}", logging.ERROR)
+        # The next recording starts a new service
+        self.ble_service.wait()
+        self.ble_service = None
+        self.recording_addresses = []
+        self.on_recording_finished()
+
+    def shutdown_ble(self):
+        if self.ble_service is not None:
+            try:
+                self.ble_service.shutdown()
+            except RuntimeError as e:
+                self.on_ble_failed(e)
+                return
+            self.ble_service.wait()
+
+    def toggle_live_overlay(self):
+        if self.live_worker is None:
+            self.live_worker = LiveOverlayWorker(self.range_slider.low, self.range_slider.high)
+            self.live_worker.log.connect(self.announce)
+            self.live_worker.error.connect(self.on_live_overlay_error)
+            self.live_worker.finished.connect(self.on_live_overlay_finished)
+            self.live_worker.start()
+
+            self.live_button.setText("Stop Live Overlay")
+        else:
+            self.live_worker.stop()
 
-        file_path, _ = QFileDialog.getOpenFileName(
-            self,
-            "Select Heart Rate Log",
-            logs_dir,
-            "CSV Files (*.csv)"
-        )
+    def on_live_overlay_error(self, message: str):
+        self.announce(f"Live overlay failed:\n{message}", logging.ERROR)
+
+    def on_live_overlay_finished(self):
+        self.live_worker = None
+        self.live_button.setText("Start Live Overlay")
+
+    def toggle_render(self):
+        if not self.rendering:
+            self.generate_video()
+        else:
+            self.announce("Cancelling render...")
+            self.button_two.setEnabled(False)
+            self.render_worker.cancel()
 
-        if not file_path:
+    def generate_video(self):
+        # Loads the catalog (and numpy with hr_log) when first needed, not with the GUI
+        from session_picker import SessionPicker
+
+        picker = SessionPicker(self, self.range_slider.low, self.range_slider.high)
+        if not picker.exec_():
             return
+        file_path = picker.selected_path
+        render_options = picker.render_options
 
         self.announce(f"Starting render:\n{file_path}")
-        self.button_two.setEnabled(False)
+        if render_options:
+            start = render_options.get("clip_start", 0)
+            length = render_options.get("clip_duration")
+            self.announce(f"Clip from {start} s" + (f" for {length} s" if length else " to the end"))
+        self.button_two.setText("Cancel Render")
+        self.rendering = True
 
         hr_interval_1 = self.range_slider.low
         hr_interval_2 = self.range_slider.high
 
-        self.render_worker = VideoRenderWorker(file_path, hr_interval_1, hr_interval_2)
+        self.render_worker = VideoRenderWorker(file_path, hr_interval_1, hr_interval_2, **render_options)
 
         self.render_worker.started.connect(
             lambda p: self.announce("Rendering started...")
         )
 
+        self.render_worker.progress.connect(self.on_render_progress)
         self.render_worker.finished.connect(self.on_render_finished)
         self.render_worker.error.connect(self.on_render_error)
+        self.render_worker.cancelled.connect(self.on_render_cancelled)
 
+        self.next_render_log = 0.0
+        self.render_resume_announced = False
         self.render_worker.start()
 
         self.taskbar_button.setOverlayIcon(self.overlay_dot_rendering)
+        self.taskbar_button.progress().reset()
+        self.taskbar_button.progress().setVisible(True)
+
+    def on_render_progress(self, metrics: dict):
+        progress = self.taskbar_button.progress()
+        progress.setRange(0, metrics["total_frames"])
+        progress.setValue(metrics["frames_done"])
+
+        if metrics["resumed_frames"] and not self.render_resume_announced:
+            self.render_resume_announced = True
+            self.announce(f"{metrics['resumed_frames']} frames already rendered, reusing them")
+
+        # The taskbar follows every report, the console only every RENDER_LOG_INTERVAL
+        if metrics["elapsed_seconds"] < self.next_render_log:
+            return
+        self.next_render_log = metrics["elapsed_seconds"] + RENDER_LOG_INTERVAL
+
+        eta = metrics["eta_seconds"]
+        eta_text = f"{int(eta // 60)}:{int(eta % 60):02d}" if eta is not None else "?"
+        self.announce(
+            f"Rendering {metrics['frames_done']}/{metrics['total_frames']} frames "
+            f"({metrics['frames_done'] / max(metrics['total_frames'], 1):.0%}), "
+            f"{metrics['fps']:.0f} fps (avg {metrics['average_fps']:.0f}), ETA {eta_text}, "
+            f"cache {metrics['cache_hit_rate']:.0%} hits, encoder queue {metrics['encoder_queue_depth']}"
+        )
     
     def on_render_finished(self, output_path: str):
         self.announce(f"Render saved to {output_path}")
-        self.button_two.setEnabled(True)
-        self.taskbar_button.clearOverlayIcon()
+        self.reset_render_controls()
 
     def on_render_error(self, message: str):
-        self.announce(f"Render failed:\n{message}")
+        self.announce(f"Render failed:\n{message}", logging.ERROR)
+        self.reset_render_controls()
+
+    def on_render_cancelled(self):
+        self.announce("Render cancelled, rendering the same log again resumes where it stopped")
+        self.reset_render_controls()
+
+    def reset_render_controls(self):
+        # Keep render_worker referenced, its thread may still be winding down
+        self.rendering = False
+        self.button_two.setText("Generate Video")
         self.button_two.setEnabled(True)
         self.taskbar_button.clearOverlayIcon()
+        self.taskbar_button.progress().setVisible(False)
 
     def open_folder(self, relative_path: str):
         path = os.path.abspath(relative_path)
         try:
             os.startfile(path)
         except Exception as e:
-            self.announce(f"Failed to open folder:\n{e}")
+            self.announce(f"Failed to open folder:\n{e}", logging.ERROR)
             
     def create_dot_icon(self, color: str):
         pixmap = QPixmap(32, 32)
@@ -264,9 +395,23 @@ class MainWindow(QWidget):
         with open("heartrate_overlay/config/color_intervals.txt", "w") as f:
             f.write(f"{low}\n{high}\n")
 
+    def show_startup_report(self, startup_timer):
+        startup_timer.mark("first paint")
+        startup_timer.uninstall()
+        for line in startup_timer.report():
+            self.announce(line)
+            print(line)
+
 if __name__ == "__main__":
+    # Render segments run in child processes, which the frozen build must support
+    multiprocessing.freeze_support()
+
+    if startup_timer:
+        startup_timer.mark("imports done")
+
+    log_file = ConsoleLog.file_path_from_argv(sys.argv)
     app = QApplication(sys.argv)
-    window = MainWindow()
+    window = MainWindow(log_file)
     window.show()
 
     # Taskbar Icon - must be AFTER window.show()
@@ -276,4 +421,13 @@ if __name__ == "__main__":
     window.overlay_dot_recording = window.create_dot_icon("red")
     window.overlay_dot_rendering = window.create_dot_icon("magenta")
 
+    # Close the logs of any strap still recording
+    app.aboutToQuit.connect(window.shutdown_ble)
+    app.aboutToQuit.connect(window.console_log.close)
+
+    if startup_timer:
+        startup_timer.mark("window shown")
+        # Queued behind the first paint, so the report includes it
+        QTimer.singleShot(0, lambda: window.show_startup_report(startup_timer))
+
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,335 @@
+import argparse
+import json
+import sqlite3
+import sys
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from hr_log import BINARY_SUFFIX, CSV_SUFFIX
+
+# ============================================================
+# CONFIG
+# ============================================================
+CATALOG_PATH = "heartrate_overlay/config/sessions.sqlite"
+LOGS_DIR = "heartrate_overlay/logs"
+LOG_SUFFIXES = (CSV_SUFFIX, BINARY_SUFFIX)
+PART_SUFFIX = ".part"  # see log_writer, a log still being recorded
+
+GAP_SECONDS = 3.0  # a longer silence between samples is a gap, as in video_renderer
+HISTOGRAM_BPM = 256  # bins of the time-per-bpm histogram, higher rates land in the last
+SCHEMA_VERSION = 2  # bump to rebuild the catalog from the logs after a SessionStats change
+
+SCHEMA = """
+CREATE TABLE sessions (
+    path TEXT PRIMARY KEY,      -- resolved log path
+    size INTEGER,               -- file size and mtime the row was computed from,
+    mtime_ns INTEGER,           -- NULL while the log is still being recorded
+    complete INTEGER NOT NULL,
+    error TEXT,                 -- why the log couldn't be read, the stats are empty then
+    start_ms INTEGER,           -- ms since 1970 as the log holds them: UTC in .hrb, local in CSV
+    end_ms INTEGER,
+    samples INTEGER NOT NULL,
+    hr_min INTEGER,
+    hr_max INTEGER,
+    hr_sum INTEGER NOT NULL,
+    gaps INTEGER NOT NULL,
+    recorded_ms INTEGER NOT NULL,
+    histogram BLOB NOT NULL     -- HISTOGRAM_BPM int64 ms spent at each bpm
+);
+CREATE INDEX sessions_start ON sessions (start_ms);
+"""
+
+
+# ============================================================
+# STATISTICS
+# ============================================================
+class SessionStats:
+    """
+    Summary of one log, built sample by sample while recording (add, add_gap) or from a
+    whole HeartRateLog (from_log); both give the same numbers for the same log.
+
+    Each sample's heart rate holds until the next one, unless they're more than
+    GAP_SECONDS apart or a gap marker lies between them: that is a gap and its time isn't
+    recorded. histogram_ms is the recorded time at each bpm, so the time in any color
+    zone follows from it for whatever intervals the slider is set to.
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.start_ms = None
+        self.end_ms = None
+        self.hr_min = None
+        self.hr_max = None
+        self.hr_sum = 0
+        self.gaps = 0
+        self.recorded_ms = 0
+        self.histogram_ms = array("q", bytes(8 * HISTOGRAM_BPM))
+        self._last_bin = 0
+        self._markers = []  # gap markers not before the latest sample
+
+    def add(self, timestamp_ms: int, heart_rate: int):
+        if self.samples:
+            elapsed = timestamp_ms - self.end_ms
+            marked = any(m < timestamp_ms for m in self._markers)
+            if marked or elapsed > GAP_SECONDS * 1000:
+                self.gaps += 1
+            else:
+                self.recorded_ms += elapsed
+                self.histogram_ms[self._last_bin] += elapsed
+            self.hr_min = min(self.hr_min, heart_rate)
+            self.hr_max = max(self.hr_max, heart_rate)
+        else:
+            self.start_ms = timestamp_ms
+            self.hr_min = self.hr_max = heart_rate
+
+        self.samples += 1
+        self.end_ms = timestamp_ms
+        self.hr_sum += heart_rate
+        self._last_bin = min(max(heart_rate, 0), HISTOGRAM_BPM - 1)
+        self._markers = [m for m in self._markers if m >= timestamp_ms]
+
+    def add_gap(self, timestamp_ms: int):
+        # By time, not by order: CSV rows keep whole seconds, so a marker can share its
+        # second with the sample before or after it and from_log can't tell which
+        if self.samples == 0 or timestamp_ms >= self.end_ms:
+            self._markers.append(timestamp_ms)
+
+    @classmethod
+    def from_log(cls, log):
+        import numpy as np
+
+        stats = cls()
+        if len(log) == 0:
+            return stats
+
+        order = np.argsort(log.timestamps_ms, kind="stable")
+        t = np.asarray(log.timestamps_ms, dtype=np.int64)[order]
+        hr = np.asarray(log.heart_rate, dtype=np.int64)[order]
+        markers = np.sort(np.asarray(log.gap_timestamps_ms, dtype=np.int64))
+
+        elapsed = np.diff(t)
+        # A marker at or after one sample and before the next splits them
+        marked = np.searchsorted(markers, t[1:], side="left") > np.searchsorted(markers, t[:-1], side="left")
+        gap = marked | (elapsed > GAP_SECONDS * 1000)
+        held = np.where(gap, 0, elapsed)
+        bins = np.clip(hr[:-1], 0, HISTOGRAM_BPM - 1)
+
+        stats.samples = len(t)
+        stats.start_ms = int(t[0])
+        stats.end_ms = int(t[-1])
+        stats.hr_min = int(hr.min())
+        stats.hr_max = int(hr.max())
+        stats.hr_sum = int(hr.sum())
+        stats.gaps = int(gap.sum())
+        stats.recorded_ms = int(held.sum())
+        stats.histogram_ms = array("q", np.bincount(bins, weights=held, minlength=HISTOGRAM_BPM).astype(np.int64).tobytes())
+        return stats
+
+
+def zone_seconds(histogram_ms, hr_interval_1, hr_interval_2):
+    """Recorded seconds below hr_interval_1, up to hr_interval_2 and above, as hr_to_color colors them."""
+    low = max(0, min(hr_interval_1, HISTOGRAM_BPM))
+    high = max(low, min(hr_interval_2, HISTOGRAM_BPM))
+    return (
+        sum(histogram_ms[:low]) / 1000.0,
+        sum(histogram_ms[low:high]) / 1000.0,
+        sum(histogram_ms[high:]) / 1000.0,
+    )
+
+
+def _sql_zone_seconds(histogram, hr_interval_1, hr_interval_2, zone):
+    histogram_ms = array("q")
+    histogram_ms.frombytes(histogram)
+    return zone_seconds(histogram_ms, hr_interval_1, hr_interval_2)[zone]
+
+
+# ============================================================
+# CATALOG
+# ============================================================
+class SessionCatalog:
+    """
+    SQLite index of heart rate logs: one row of SessionStats per log, keyed by its
+    resolved path. The recorder calls update() as it writes, so a finished recording is
+    indexed without reading it back; refresh() catches up with a folder, reading only the
+    logs whose size or modification time changed. WAL mode lets the GUI read while the
+    recorder writes. A connection belongs to the thread that opened it.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # an index, losing the last commit on power loss is fine
+        self.db.create_function("zone_seconds", 4, _sql_zone_seconds, deterministic=True)
+
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            with self.db:
+                self.db.execute("DROP TABLE IF EXISTS sessions")
+                self.db.executescript(SCHEMA)
+                self.db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    # --- Writing ---
+    def update(self, log_path, stats: SessionStats, complete=True, error=None):
+        """Stores stats as the row of log_path. A complete row remembers the file's size and mtime."""
+        log_path = Path(log_path).resolve()
+        size = mtime_ns = None
+        if complete:
+            stat = log_path.stat()
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(log_path), size, mtime_ns, int(complete), error,
+                    stats.start_ms, stats.end_ms, stats.samples, stats.hr_min, stats.hr_max, stats.hr_sum,
+                    stats.gaps, stats.recorded_ms, stats.histogram_ms.tobytes(),
+                ),
+            )
+
+    def refresh(self, directory=LOGS_DIR, progress_callback=None):
+        """
+        Brings the rows of the logs in directory up to date and drops those of deleted logs.
+        progress_callback(done, total) follows the logs that have to be read. Returns counts
+        of the logs "indexed", "unchanged", "failed" and "removed".
+        """
+        from hr_log import read_hr_log
+
+        directory = Path(directory).resolve()
+        logs = sorted(p for p in directory.iterdir() if p.suffix.lower() in LOG_SUFFIXES)
+
+        known = {
+            row["path"]: (row["size"], row["mtime_ns"], row["complete"])
+            for row in self.db.execute("SELECT path, size, mtime_ns, complete FROM sessions")
+        }
+        counts = {"indexed": 0, "unchanged": 0, "failed": 0, "removed": 0}
+
+        changed = []
+        for log_path in logs:
+            stat = log_path.stat()
+            if known.get(str(log_path)) == (stat.st_size, stat.st_mtime_ns, 1):
+                counts["unchanged"] += 1
+            else:
+                changed.append(log_path)
+
+        for done, log_path in enumerate(changed, 1):
+            # One commit per log, so the recorder is never locked out for a whole rebuild
+            try:
+                self.update(log_path, SessionStats.from_log(read_hr_log(log_path)))
+                counts["indexed"] += 1
+            except Exception as e:
+                self.update(log_path, SessionStats(), error=f"{type(e).__name__}: {e}")
+                counts["failed"] += 1
+            if progress_callback is not None:
+                progress_callback(done, len(changed))
+
+        present = {str(p) for p in logs}
+        for path, (_, _, complete) in known.items():
+            log_path = Path(path)
+            if log_path.parent != directory or path in present:
+                continue
+            # A log being recorded exists as .part until it is closed
+            if complete or not log_path.with_name(log_path.name + PART_SUFFIX).exists():
+                with self.db:
+                    self.db.execute("DELETE FROM sessions WHERE path = ?", (path,))
+                counts["removed"] += 1
+
+        return counts
+
+    # --- Reading ---
+    def sessions(self, hr_interval_1, hr_interval_2, name_filter="", min_seconds=0.0, include_failed=False):
+        """
+        Finished sessions, newest first, as dicts with their stats and zone_seconds, the
+        recorded seconds in each color zone for the given intervals. name_filter matches
+        part of the log's path, min_seconds is the shortest duration listed. Logs without
+        samples (e.g. only a header) stay indexed but aren't listed, they have nothing to render.
+        """
+        rows = self.db.execute(
+            """
+            SELECT *,
+                zone_seconds(histogram, :low, :high, 0) AS zone_0,
+                zone_seconds(histogram, :low, :high, 1) AS zone_1,
+                zone_seconds(histogram, :low, :high, 2) AS zone_2
+            FROM sessions
+            WHERE complete
+                AND (:failed OR error IS NULL)
+                AND (samples > 0 OR error IS NOT NULL)
+                AND instr(lower(path), lower(:name)) > 0
+                AND coalesce(end_ms - start_ms, 0) >= :min_ms
+            """,
+            {"low": hr_interval_1, "high": hr_interval_2, "failed": int(include_failed),
+             "name": name_filter, "min_ms": min_seconds * 1000},
+        )
+        # By local start, start_ms of the two formats aren't comparable
+        return sorted(map(_session_dict, rows), key=lambda s: s["start"] or datetime.min, reverse=True)
+
+
+def _session_dict(row):
+    samples = row["samples"]
+    return {
+        "path": row["path"],
+        "name": Path(row["path"]).name,
+        "start": _wall_clock(row["start_ms"], Path(row["path"]).suffix.lower() == BINARY_SUFFIX),
+        "duration_seconds": (row["end_ms"] - row["start_ms"]) / 1000.0 if samples else 0.0,
+        "samples": samples,
+        "hr_min": row["hr_min"],
+        "hr_avg": row["hr_sum"] / samples if samples else None,
+        "hr_max": row["hr_max"],
+        "gaps": row["gaps"],
+        "recorded_seconds": row["recorded_ms"] / 1000.0,
+        "zone_seconds": (row["zone_0"], row["zone_1"], row["zone_2"]),
+        "error": row["error"],
+    }
+
+
+def _wall_clock(timestamp_ms, utc):
+    """The naive local datetime of an hr_log timestamp (UTC if utc, as in .hrb), None for None."""
+    if timestamp_ms is None:
+        return None
+    if utc:
+        return datetime.fromtimestamp(timestamp_ms / 1000.0)
+    return datetime(1970, 1, 1) + timedelta(milliseconds=timestamp_ms)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the heart rate logs and list their sessions.")
+    parser.add_argument("--logs-dir", default=LOGS_DIR)
+    parser.add_argument("--catalog", default=CATALOG_PATH)
+    parser.add_argument("--intervals", type=int, nargs=2, metavar=("LOW", "HIGH"), default=(0, 150),
+                        help="color intervals for the time in each zone")
+    parser.add_argument("--filter", default="", help="part of the log's path")
+    parser.add_argument("--min-minutes", type=float, default=0.0, help="shortest session listed")
+    parser.add_argument("--rebuild", action="store_true", help="read every log again")
+    parser.add_argument("--json", action="store_true", help="print the sessions as JSON")
+    args = parser.parse_args()
+
+    catalog = SessionCatalog(args.catalog)
+    if args.rebuild:
+        with catalog.db:
+            catalog.db.execute("DELETE FROM sessions")
+
+    counts = catalog.refresh(
+        args.logs_dir,
+        progress_callback=lambda done, total: print(f"\rIndexing {done}/{total}", end="", file=sys.stderr),
+    )
+    print(f"\n{counts}", file=sys.stderr)
+
+    sessions = catalog.sessions(*args.intervals, args.filter, args.min_minutes * 60)
+    catalog.close()
+
+    if args.json:
+        json.dump(sessions, sys.stdout, indent=2, default=str)
+        print()
+    else:
+        for s in sessions:
+            zones = " / ".join(f"{seconds / 60:.0f}" for seconds in s["zone_seconds"])
+            print(
+                f"{s['start']:%Y-%m-%d %H:%M}  {s['duration_seconds'] / 60:6.1f} min  "
+                f"HR {s['hr_min']}-{s['hr_avg']:.0f}-{s['hr_max']}  zones {zones} min  "
+                f"{s['gaps']} gaps  {s['name']}"
+            )
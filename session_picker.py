@@ -0,0 +1,242 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QSpinBox, QLabel, QPushButton,
+    QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QFileDialog, QTimeEdit,
+)
+from PyQt5.QtCore import Qt, QThread, QTime, pyqtSignal
+from PyQt5.QtGui import QColor
+
+from session_catalog import CATALOG_PATH, LOGS_DIR, SessionCatalog
+
+ZONE_COLORS = (QColor(93, 251, 8), QColor(250, 186, 9), QColor(249, 35, 4))  # as the range slider
+COLUMNS = ["Session", "Start", "Duration", "Min", "Avg", "Max", "", "", "", "Gaps"]
+
+
+class _RefreshStopped(Exception):
+    pass
+
+
+class CatalogRefreshWorker(QThread):
+    """Indexes new and changed logs off the GUI thread, with its own catalog connection."""
+    progress = pyqtSignal(int, int)  # logs read, logs to read
+    refreshed = pyqtSignal(dict)  # SessionCatalog.refresh counts
+    error = pyqtSignal(str)
+
+    def __init__(self, logs_dir=LOGS_DIR, catalog_path=CATALOG_PATH):
+        super().__init__()
+        self.logs_dir = logs_dir
+        self.catalog_path = catalog_path
+        self.stopped = False
+
+    def stop(self):
+        """Stops after the log being read, the ones read so far stay indexed."""
+        self.stopped = True
+
+    def _progress(self, done, total):
+        if self.stopped:
+            raise _RefreshStopped
+        self.progress.emit(done, total)
+
+    def run(self):
+        try:
+            catalog = SessionCatalog(self.catalog_path)
+            try:
+                counts = catalog.refresh(self.logs_dir, progress_callback=self._progress)
+            finally:
+                catalog.close()
+            self.refreshed.emit(counts)
+        except _RefreshStopped:
+            pass
+        except Exception as e:
+            self.error.emit(str(e))
+
+
+class _NumberItem(QTableWidgetItem):
+    """A cell shown as text but sorted by value."""
+
+    def __init__(self, text, value):
+        super().__init__(text)
+        self.value = value
+
+    def __lt__(self, other):
+        if isinstance(other, _NumberItem):
+            return self.value < other.value
+        return super().__lt__(other)
+
+
+def _minutes(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class SessionPicker(QDialog):
+    """
+    Lists the recorded sessions from the SessionCatalog with their duration, heart rate
+    range and time in each color zone for the slider's intervals, filtered by name and
+    minimum length. Logs recorded or changed since the last look are indexed in the
+    background while the known ones are already listed. selected_path is the picked log
+    and render_options the part of it to render (render_video's clip keywords), if any.
+    """
+
+    def __init__(self, parent, hr_interval_1, hr_interval_2, logs_dir=LOGS_DIR, catalog_path=CATALOG_PATH):
+        super().__init__(parent)
+        self.hr_interval_1 = hr_interval_1
+        self.hr_interval_2 = hr_interval_2
+        self.logs_dir = logs_dir
+        self.catalog = SessionCatalog(catalog_path)
+        self.selected_path = None
+        self.render_options = {}
+
+        self.setWindowTitle("Select Heart Rate Log")
+        self.resize(860, 480)
+        layout = QVBoxLayout(self)
+
+        # --- Filters ---
+        filters = QHBoxLayout()
+        layout.addLayout(filters)
+
+        self.name_filter = QLineEdit()
+        self.name_filter.setPlaceholderText("Filter by name")
+        self.name_filter.textChanged.connect(lambda text: self.load_sessions())
+        filters.addWidget(self.name_filter, stretch=1)
+
+        filters.addWidget(QLabel("At least"))
+        self.min_minutes = QSpinBox()
+        self.min_minutes.setRange(0, 24 * 60)
+        self.min_minutes.setSuffix(" min")
+        self.min_minutes.valueChanged.connect(lambda value: self.load_sessions())
+        filters.addWidget(self.min_minutes)
+
+        self.status = QLabel()
+        filters.addWidget(self.status)
+
+        # --- Sessions ---
+        self.table = QTableWidget(0, len(COLUMNS))
+        zone_names = (f"< {hr_interval_1}", f"{hr_interval_1}-{hr_interval_2}", f"≥ {hr_interval_2}")
+        self.table.setHorizontalHeaderLabels(COLUMNS[:6] + [f"{name} bpm" for name in zone_names] + COLUMNS[9:])
+        for zone, color in enumerate(ZONE_COLORS):
+            self.table.horizontalHeaderItem(6 + zone).setForeground(color.darker(150))
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setSortingEnabled(True)
+        self.table.itemDoubleClicked.connect(lambda item: self.pick_selected())
+        layout.addWidget(self.table)
+
+        # --- Buttons ---
+        buttons = QHBoxLayout()
+        layout.addLayout(buttons)
+
+        browse_button = QPushButton("Browse...")
+        browse_button.clicked.connect(self.browse)
+        buttons.addWidget(browse_button)
+        buttons.addStretch()
+
+        # Time into the session and length of the clip, a length of 0:00:00 runs to its end
+        buttons.addWidget(QLabel("From"))
+        self.clip_start = QTimeEdit()
+        self.clip_start.setDisplayFormat("H:mm:ss")
+        buttons.addWidget(self.clip_start)
+
+        buttons.addWidget(QLabel("Length"))
+        self.clip_duration = QTimeEdit()
+        self.clip_duration.setDisplayFormat("H:mm:ss")
+        self.clip_duration.setToolTip("0:00:00 renders to the end of the session")
+        buttons.addWidget(self.clip_duration)
+
+        render_button = QPushButton("Render")
+        render_button.setDefault(True)
+        render_button.clicked.connect(self.pick_selected)
+        buttons.addWidget(render_button)
+
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.reject)
+        buttons.addWidget(cancel_button)
+
+        self.load_sessions()
+
+        self.refresh_worker = CatalogRefreshWorker(logs_dir, catalog_path)
+        self.refresh_worker.progress.connect(self.on_refresh_progress)
+        self.refresh_worker.refreshed.connect(self.on_refreshed)
+        self.refresh_worker.error.connect(lambda message: self.status.setText(f"Indexing failed: {message}"))
+        self.refresh_worker.start()
+
+    def load_sessions(self):
+        sessions = self.catalog.sessions(
+            self.hr_interval_1, self.hr_interval_2, self.name_filter.text(), self.min_minutes.value() * 60
+        )
+
+        # Filling a sorted table moves rows under the loop
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(sessions))
+        for row, s in enumerate(sessions):
+            name = QTableWidgetItem(s["name"])
+            name.setData(Qt.UserRole, s["path"])
+            name.setToolTip(s["path"])
+            recorded = s["recorded_seconds"] or 1.0
+            cells = [
+                name,
+                _NumberItem(f"{s['start']:%Y-%m-%d %H:%M}", s["start"]),
+                _NumberItem(_minutes(s["duration_seconds"]), s["duration_seconds"]),
+                _NumberItem(str(s["hr_min"]), s["hr_min"]),
+                _NumberItem(f"{s['hr_avg']:.0f}", s["hr_avg"]),
+                _NumberItem(str(s["hr_max"]), s["hr_max"]),
+                *[
+                    _NumberItem(f"{_minutes(seconds)} ({seconds / recorded:.0%})", seconds)
+                    for seconds in s["zone_seconds"]
+                ],
+                _NumberItem(str(s["gaps"]), s["gaps"]),
+            ]
+            for column, item in enumerate(cells):
+                self.table.setItem(row, column, item)
+        self.table.setSortingEnabled(True)
+
+        if not self.refreshing():
+            self.status.setText(f"{len(sessions)} sessions")
+
+    def refreshing(self):
+        worker = getattr(self, "refresh_worker", None)
+        return worker is not None and worker.isRunning()
+
+    def on_refresh_progress(self, done, total):
+        self.status.setText(f"Indexing {done}/{total}...")
+
+    def on_refreshed(self, counts):
+        if counts["indexed"] or counts["removed"]:
+            self.load_sessions()
+        message = f"{self.table.rowCount()} sessions"
+        if counts["failed"]:
+            message += f", {counts['failed']} unreadable"
+        self.status.setText(message)
+
+    def pick_selected(self):
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            return
+        self.selected_path = self.table.item(rows[0].row(), 0).data(Qt.UserRole)
+        self.accept_clip()
+
+    def browse(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Select Heart Rate Log", self.logs_dir, "Heart Rate Logs (*.csv *.hrb)")
+        if file_path:
+            self.selected_path = file_path
+            self.accept_clip()
+
+    def accept_clip(self):
+        start = QTime(0, 0).secsTo(self.clip_start.time())
+        duration = QTime(0, 0).secsTo(self.clip_duration.time())
+        self.render_options = {}
+        if start:
+            self.render_options["clip_start"] = start
+        if duration:
+            self.render_options["clip_duration"] = duration
+        self.accept()
+
+    def done(self, result):
+        # The worker has its own connection, let it stop between logs rather than kill it mid-commit
+        self.refresh_worker.stop()
+        self.refresh_worker.wait()
+        self.catalog.close()
+        super().done(result)
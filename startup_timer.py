@@ -0,0 +1,106 @@
+import importlib.abc
+import sys
+import threading
+import time
+
+STARTUP_REPORT_FLAG = "--startup-report"
+REPORT_TOP = 12  # packages and modules listed in the report
+
+
+class StartupTimer(importlib.abc.MetaPathFinder):
+    """
+    Times every import made after install() plus the startup phases passed to mark().
+    It wraps each module's loader rather than relying on -X importtime, so it also works
+    in the frozen PyInstaller build. A module's time includes the imports it makes itself;
+    its self time doesn't.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = []  # (phase, seconds since start)
+        self.total_seconds = {}  # module -> seconds, nested imports included
+        self.self_seconds = {}  # module -> seconds, nested imports excluded
+        self._nested = threading.local()
+
+    @classmethod
+    def from_argv(cls, argv):
+        """An installed timer if argv asks for a startup report, otherwise None."""
+        if STARTUP_REPORT_FLAG not in argv:
+            return None
+        argv.remove(STARTUP_REPORT_FLAG)
+        timer = cls()
+        sys.meta_path.insert(0, timer)
+        return timer
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def mark(self, phase):
+        self.marks.append((phase, time.perf_counter() - self.start))
+
+    # --- Import hook ---
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, name, self)
+            return spec
+        return None
+
+    def _exec_module(self, name, loader, module):
+        stack = self._nested.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            self.total_seconds[name] = elapsed
+            self.self_seconds[name] = elapsed - nested
+            if stack:
+                stack[-1] += elapsed
+
+    # --- Report ---
+    def report(self, top=REPORT_TOP):
+        """Text lines: the phases, then import time by top-level package and the slowest modules."""
+        phases = ", ".join(f"{phase} at {seconds * 1000:.0f} ms" for phase, seconds in self.marks)
+        lines = [f"Startup: {phases}"]
+
+        packages = {}
+        for name, seconds in self.self_seconds.items():
+            package = name.partition(".")[0]
+            packages[package] = packages.get(package, 0.0) + seconds
+        lines.append(f"Imports: {len(self.self_seconds)} modules in {sum(packages.values()) * 1000:.0f} ms")
+
+        lines.append("By package:")
+        for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {seconds * 1000:7.1f} ms  {package}")
+
+        lines.append("Slowest modules (with their imports):")
+        for name, seconds in sorted(self.total_seconds.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {seconds * 1000:7.1f} ms  {name}")
+        return lines
+
+
+class _TimedLoader:
+    """Passes everything through to loader, timing exec_module."""
+
+    def __init__(self, loader, name, timer):
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer._exec_module(self._name, self._loader, module)
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from hr_log import CSV_HEADER, LogIndex, convert_csv_log
+from video_renderer import FPS, OverlayLayout, render_video
+
+SCALE = 0.5  # small frames keep the raw outputs small
+
+
+@pytest.fixture(autouse=True)
+def repo_dir(monkeypatch):
+    # The assets are found relative to the working directory, as in the app
+    monkeypatch.chdir(Path(__file__).resolve().parent.parent)
+
+
+def _write_csv(path, seconds, start=datetime(2024, 5, 1, 10, 0, 0), gap_at=None):
+    """A one-sample-per-second CSV log; seconds are offsets from start, in file order."""
+    rng = np.random.default_rng(7)
+    rows = [CSV_HEADER]
+    for i, second in enumerate(seconds):
+        if second == gap_at:
+            rows.append(f"{(start + timedelta(seconds=second)):%Y-%m-%d %H:%M:%S},,\n")
+        hr = 100 + int(40 * np.sin(i / 9)) + int(rng.integers(-3, 4))
+        rows.append(f"{(start + timedelta(seconds=second)):%Y-%m-%d %H:%M:%S},{hr},{round(60000 / hr)}\n")
+    path.write_text("".join(rows))
+    return path
+
+
+def _frames(output_file):
+    layout = OverlayLayout(SCALE)
+    return np.fromfile(output_file, np.uint8).reshape(-1, layout.height, layout.width, 4)
+
+
+def _render(log_path, output_dir, **options):
+    return render_video(str(log_path), 120, 160, workers=1, encoder="rgba", scale=SCALE, cache=False,
+                        resume=False, output_dir=str(output_dir), **options)
+
+
+def _assert_clip_matches(log_path, tmp_path, clip_start, clip_duration, **options):
+    full = _frames(_render(log_path, tmp_path / "full", **options))
+    clip = _frames(_render(log_path, tmp_path / "clip", clip_start=clip_start, clip_duration=clip_duration,
+                           **options))
+
+    first = clip_start * FPS
+    assert len(clip) == clip_duration * FPS
+    full = full[first:first + len(clip)]
+    if options.get("sparkline"):
+        # A clip's sparkline is scaled to the history it read, not to the whole log's
+        layout = OverlayLayout(SCALE)
+        band = slice(layout.sparkline_y, layout.sparkline_y + layout.sparkline_height)
+        clip, full = np.delete(clip, band, axis=1), np.delete(full, band, axis=1)
+    np.testing.assert_array_equal(clip, full)
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"interpolation": "linear", "gap_policy": "dashes"},
+    {"gap_policy": "fade", "beat_source": "rr"},
+    {"sparkline": True},
+])
+def test_clip_matches_the_full_render(tmp_path, options):
+    log_path = _write_csv(tmp_path / "ride.csv", [s for s in range(60) if not 20 <= s < 26], gap_at=26)
+    _assert_clip_matches(log_path, tmp_path, 30, 15, **options)
+
+
+def test_binary_clip_matches_the_full_render(tmp_path):
+    log_path = convert_csv_log(_write_csv(tmp_path / "ride.csv", range(60)))
+    _assert_clip_matches(log_path, tmp_path, 30, 15, sparkline=True)
+
+
+def test_clip_of_a_log_out_of_time_order(tmp_path):
+    # The clock stepped back 50 s after a minute of recording
+    log_path = _write_csv(tmp_path / "ride.csv", [*range(60), *range(10, 30)])
+    with LogIndex(log_path) as index:
+        assert not index.in_order
+        assert (index.first_ms, index.last_ms) == (index.sorted_log.timestamps_ms[0], index.sorted_log.timestamps_ms[-1])
+        with pytest.raises(ValueError):
+            index.seek(index.first_ms)
+
+    _assert_clip_matches(log_path, tmp_path, 15, 10)
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from hr_log import (
+    FLAG_GAP, HEADER, MAGIC, MAX_RR, LogIndex, binary_header, convert_csv_log, pack_record, read_binary_log, read_hr_log,
+)
+from log_writer import BufferedLogWriter
+from session_catalog import SessionStats
+
+FALL_BACK = datetime(2024, 11, 3, 5, 59, tzinfo=timezone.utc).timestamp()  # 01:59 EDT, then 01:00 EST
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _record(path, start, seconds, gap_at=None):
+    writer = BufferedLogWriter(path)
+    writer.open()
+    for i in range(seconds):
+        if i == gap_at:
+            writer.append_gap(start + i)
+        writer.append(start + i + 0.25, 100 + i % 20, (600,))
+    writer.flush()
+    asyncio.run(writer.close())
+    return writer
+
+
+def test_binary_log_round_trip(tmp_path):
+    rows = [
+        (1_700_000_000_000, 92, (640, 652)),
+        (1_700_000_001_000, 95, ()),
+        (1_700_000_004_500, 0, (), FLAG_GAP),
+        (1_700_000_006_000, 301, tuple(range(600, 600 + MAX_RR))),
+    ]
+    path = tmp_path / "ride.hrb"
+    # A record cut short by a crash is left out
+    path.write_bytes(binary_header() + b"".join(pack_record(*row) for row in rows) + pack_record(0, 1)[:7])
+
+    log = read_binary_log(path)
+    samples = [row for row in rows if len(row) == 3]
+    assert log.timestamps_ms.tolist() == [row[0] for row in samples]
+    assert log.heart_rate.tolist() == [row[1] for row in samples]
+    assert log.rr_count.tolist() == [len(row[2]) for row in samples]
+    assert [log.rr_ms[i, :n].tolist() for i, n in enumerate(log.rr_count)] == [list(row[2]) for row in samples]
+    assert log.gap_timestamps_ms.tolist() == [1_700_000_004_500]
+    assert log.seconds.tolist() == [0.0, 1.0, 6.0]
+
+
+def test_binary_log_of_another_version(tmp_path):
+    path = tmp_path / "ride.hrb"
+    path.write_bytes(HEADER.pack(MAGIC, 1, 18) + bytes(18))
+    with pytest.raises(ValueError):
+        read_hr_log(path)
+
+
+def test_binary_log_counts_through_dst_fall_back(tmp_path, new_york):
+    writer = _record(tmp_path / "ride.hrb", FALL_BACK, 120)
+
+    log = read_hr_log(tmp_path / "ride.hrb")
+    assert log.timestamps_ms[0] == round((FALL_BACK + 0.25) * 1000)
+    assert (np.diff(log.timestamps_ms) == 1000).all()
+
+    stats = SessionStats.from_log(log)
+    assert stats.end_ms - stats.start_ms == 119_000
+    assert (writer.stats.start_ms, writer.stats.end_ms) == (stats.start_ms, stats.end_ms)
+
+
+def test_csv_conversion_localizes_the_repeated_hour(tmp_path, new_york):
+    _record(tmp_path / "ride.csv", FALL_BACK, 120, gap_at=90)
+
+    log = read_hr_log(convert_csv_log(tmp_path / "ride.csv"))
+    # CSV rows keep whole seconds
+    assert log.timestamps_ms[0] == FALL_BACK * 1000
+    assert (np.diff(log.timestamps_ms) == 1000).all()
+    assert log.gap_timestamps_ms.tolist() == [(FALL_BACK + 90) * 1000]
+
+
+@pytest.mark.parametrize("suffix", [".hrb", ".csv"])
+def test_extra_rr_intervals_keep_the_latest(tmp_path, suffix):
+    rr_ms = tuple(range(500, 500 + 11 * 10, 10))  # 11 intervals, more than a record holds
+    writer = BufferedLogWriter(tmp_path / f"ride{suffix}")
+    writer.open()
+    writer.append(1_700_000_000.0, 100, ())
+    writer.append(1_700_000_010.0, 100, rr_ms)
+    writer.flush()
+    asyncio.run(writer.close())
+
+    log = read_hr_log(tmp_path / f"ride{suffix}")
+    assert log.rr_count.tolist() == [0, MAX_RR]
+    assert log.rr_ms[1].tolist() == list(rr_ms[-MAX_RR:])
+    # The last beat still lies at the notification, the dropped ones were the earliest
+    beats = log.beat_seconds()
+    assert beats[-1] == 10.0
+    assert beats[0] == 10.0 - sum(rr_ms[-MAX_RR + 1:]) / 1000
+
+
+@pytest.mark.parametrize("suffix", [".hrb", ".csv"])
+def test_log_index_seek(tmp_path, suffix):
+    _record(tmp_path / f"ride{suffix}", 1_700_000_000, 600, gap_at=300)
+    timestamps = read_hr_log(tmp_path / f"ride{suffix}").timestamps_ms
+
+    with LogIndex(tmp_path / f"ride{suffix}") as index:
+        assert index.in_order
+        assert (index.first_ms, index.last_ms) == (timestamps[0], timestamps[-1])
+        assert index.seek(timestamps[0] - 1000) == index.data_start
+        assert index.seek(timestamps[-1] + 1) == index.end
+
+        for i in [0, 1, 299, 300, 301, 599]:
+            for target in [timestamps[i] - 1, timestamps[i]]:
+                pos = index.seek(target)
+                # The first row at or after target, the gap marker before sample 300 included
+                assert index.read(pos, index.end).timestamps_ms[0] == timestamps[i]
+                assert pos == index.data_start or index.read(index.data_start, pos).timestamps_ms[-1] < target
+
+
+@pytest.mark.parametrize("suffix", [".hrb", ".csv"])
+def test_log_index_read_range(tmp_path, suffix):
+    _record(tmp_path / f"ride{suffix}", 1_700_000_000, 600, gap_at=300)
+    log = read_hr_log(tmp_path / f"ride{suffix}")
+    t = log.timestamps_ms
+
+    with LogIndex(tmp_path / f"ride{suffix}") as index:
+        part = index.read_range(t[290] + 500, t[310] + 500)
+        # From the sample in effect at the start to the first one after the end
+        assert part.timestamps_ms.tolist() == t[290:312].tolist()
+        assert part.heart_rate.tolist() == log.heart_rate[290:312].tolist()
+        assert part.gap_timestamps_ms.tolist() == log.gap_timestamps_ms.tolist()
+        assert part.origin_ms == t[0]
+
+        assert index.read_range(t[0] - 5000, t[0]).timestamps_ms.tolist() == [t[0]]
+        assert index.read_range(t[-1], t[-1] + 5000).timestamps_ms.tolist() == [t[-1]]
@@ -0,0 +1,51 @@
+import struct
+
+import pytest
+
+from hrm_parser import (
+    FLAG_CONTACT_DETECTED, FLAG_CONTACT_SUPPORTED, FLAG_ENERGY_EXPENDED, FLAG_HR_UINT16, FLAG_RR_INTERVALS,
+    parse_heart_rate_measurement,
+)
+
+
+def test_uint8_heart_rate():
+    assert parse_heart_rate_measurement(bytes([0x00, 72])) == (72, (), None, None)
+
+
+def test_uint16_heart_rate():
+    data = bytes([FLAG_HR_UINT16]) + struct.pack("<H", 300)
+    assert parse_heart_rate_measurement(data) == (300, (), None, None)
+
+
+@pytest.mark.parametrize("hr_flag, hr_bytes", [(0x00, bytes([150])), (FLAG_HR_UINT16, struct.pack("<H", 150))])
+def test_energy_expended(hr_flag, hr_bytes):
+    data = bytes([hr_flag | FLAG_ENERGY_EXPENDED]) + hr_bytes + struct.pack("<H", 1234)
+    assert parse_heart_rate_measurement(data) == (150, (), 1234, None)
+
+
+@pytest.mark.parametrize("energy", [None, 500])
+@pytest.mark.parametrize("hr_flag, hr_bytes", [(0x00, bytes([60])), (FLAG_HR_UINT16, struct.pack("<H", 60))])
+def test_rr_intervals(hr_flag, hr_bytes, energy):
+    flags = hr_flag | FLAG_RR_INTERVALS
+    data = hr_bytes
+    if energy is not None:
+        flags |= FLAG_ENERGY_EXPENDED
+        data += struct.pack("<H", energy)
+    # 1/1024 s units: 1024 is exactly 1 s, 512 half of it and 1000 rounds to 977 ms
+    data = bytes([flags]) + data + struct.pack("<3H", 1024, 512, 1000)
+
+    assert parse_heart_rate_measurement(data) == (60, (1000, 500, 977), energy, None)
+
+
+def test_rr_flag_without_intervals():
+    assert parse_heart_rate_measurement(bytes([FLAG_RR_INTERVALS, 80])) == (80, (), None, None)
+
+
+@pytest.mark.parametrize("flags, contact", [
+    (0x00, None),
+    (FLAG_CONTACT_DETECTED, None),
+    (FLAG_CONTACT_SUPPORTED, False),
+    (FLAG_CONTACT_SUPPORTED | FLAG_CONTACT_DETECTED, True),
+])
+def test_contact(flags, contact):
+    assert parse_heart_rate_measurement(bytes([flags, 90]))[3] is contact
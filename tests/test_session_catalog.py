@@ -0,0 +1,47 @@
+import numpy as np
+
+from hr_log import CSV_HEADER, HeartRateLog, binary_header
+from session_catalog import SessionCatalog, SessionStats, zone_seconds
+
+
+def test_recorded_stats_match_the_log():
+    # 1 s samples, a 10 s dropout after 100 and a marked gap after 200
+    timestamps_ms = np.array([*range(0, 101_000, 1000), *range(111_000, 301_000, 1000)], dtype=np.int64)
+    heart_rate = (120 + 40 * np.sin(np.arange(len(timestamps_ms)) / 15)).astype(np.int16)
+    gap_ms = 200_500
+
+    recorded = SessionStats()
+    for timestamp_ms, hr in zip(timestamps_ms.tolist(), heart_rate.tolist()):
+        if timestamp_ms == gap_ms + 500:
+            recorded.add_gap(gap_ms)
+        recorded.add(timestamp_ms, hr)
+    stats = SessionStats.from_log(HeartRateLog(timestamps_ms, heart_rate, gap_timestamps_ms=np.array([gap_ms])))
+
+    for name in ["samples", "start_ms", "end_ms", "hr_min", "hr_max", "hr_sum", "gaps", "recorded_ms", "histogram_ms"]:
+        assert getattr(recorded, name) == getattr(stats, name), name
+    assert (stats.gaps, stats.recorded_ms) == (2, 300_000 - 11_000 - 1000)
+    assert sum(zone_seconds(stats.histogram_ms, 110, 150)) == stats.recorded_ms / 1000
+
+
+def test_empty_logs_are_indexed_but_not_listed(tmp_path):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    (logs / "header_only.csv").write_text(CSV_HEADER)
+    (logs / "header_only.hrb").write_bytes(binary_header())
+    (logs / "ride.csv").write_text(
+        CSV_HEADER + "2024-05-01 10:00:00,100,\n2024-05-01 10:00:01,110,\n2024-05-01 10:00:02,120,\n"
+    )
+
+    catalog = SessionCatalog(tmp_path / "sessions.sqlite")
+    try:
+        counts = catalog.refresh(logs)
+        assert counts == {"indexed": 3, "unchanged": 0, "failed": 0, "removed": 0}
+
+        sessions = catalog.sessions(110, 150)
+        assert [s["name"] for s in sessions] == ["ride.csv"]
+        assert sessions[0]["hr_avg"] == 110
+
+        # Still known, so not read again
+        assert catalog.refresh(logs)["unchanged"] == 3
+    finally:
+        catalog.close()
@@ -0,0 +1,41 @@
+import av
+import numpy as np
+
+from video_encoders import ENCODERS
+
+WIDTH, HEIGHT, FPS = 64, 32, 30
+
+
+def _encode_segment(backend, path, frames):
+    container, stream = backend.open(path, WIDTH, HEIGHT, FPS)
+    for _ in range(frames):
+        rgba = np.zeros((HEIGHT, WIDTH, 4), np.uint8)
+        rgba[8:24, 8:40] = (255, 0, 0, 200)
+        frame = av.VideoFrame.from_ndarray(rgba, format="rgba").reformat(format=backend.pix_fmt)
+        for packet in stream.encode(frame):
+            container.mux(packet)
+    for packet in stream.encode():
+        container.mux(packet)
+    container.close()
+
+
+def _alpha_mode(path):
+    with av.open(str(path)) as container:
+        metadata = container.streams.video[0].metadata
+    return {key.lower(): value for key, value in metadata.items()}.get("alpha_mode")
+
+
+def test_webm_keeps_alpha_mode_through_concat_and_split(tmp_path):
+    backend = ENCODERS["vp9"]
+    segments = [tmp_path / "0.webm", tmp_path / "1.webm"]
+    for segment in segments:
+        _encode_segment(backend, segment, FPS)
+    assert _alpha_mode(segments[0]) == "1"
+
+    output = tmp_path / "out.webm"
+    backend.concat([(segments[0], 0), (segments[1], FPS)], output, FPS)
+    assert _alpha_mode(output) == "1"
+
+    split = [tmp_path / "split0.webm", tmp_path / "split1.webm"]
+    backend.split(output, 2 * FPS, [(0, FPS), (FPS, 2 * FPS)], split, FPS)
+    assert [_alpha_mode(path) for path in split] == ["1", "1"]
@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+import pytest
+
+from video_renderer import (
+    BEAT_SCALE, DUB_DURATION, DUB_START, FADE_SECONDS, FPS, GAP_SECONDS, HR_RATE_MULTIPLIER, HR_SMOOTHING,
+    LUB_DECAY_END, LUB_DECAY_STRENGTH, LUB_RISE_END, NO_READING, heart_index, heartbeat_track, resample_hr,
+)
+
+# Samples every second, then a 7 s dropout before the last two
+SECONDS = np.array([0, 1, 2, 3, 10, 11])
+HEART_RATE = np.array([100, 110, 120, 130, 90, 95])
+FRAME_SECONDS = np.arange(12 * FPS) / FPS
+IN_GAP = (FRAME_SECONDS > 3 + GAP_SECONDS) & (FRAME_SECONDS < 10)
+
+
+def _scalar_heartbeat(target_hr, dt, smoothed_hr=None, beat_phase=0.0):
+    """The frame-by-frame engine heartbeat_track replaced."""
+    scales, smoothed, phases = [], [], []
+    for hr in target_hr:
+        smoothed_hr = hr if smoothed_hr is None else smoothed_hr + (hr - smoothed_hr) * HR_SMOOTHING
+        beat_phase = (beat_phase + dt / (60.0 / (smoothed_hr * HR_RATE_MULTIPLIER))) % 1.0
+
+        pulse = 0.0
+        if beat_phase < LUB_RISE_END:
+            pulse += math.sin(beat_phase / LUB_RISE_END * math.pi * 0.5)
+        elif beat_phase < LUB_DECAY_END:
+            pulse += math.exp(-LUB_DECAY_STRENGTH * (beat_phase - LUB_RISE_END) / (LUB_DECAY_END - LUB_RISE_END))
+        if DUB_START <= beat_phase < DUB_START + DUB_DURATION:
+            pulse += math.sin((beat_phase - DUB_START) / DUB_DURATION * math.pi)
+
+        scales.append(1.0 + BEAT_SCALE * pulse)
+        smoothed.append(smoothed_hr)
+        phases.append(beat_phase)
+    return np.array(scales), np.array(smoothed), np.array(phases)
+
+
+def _target_hr(seconds):
+    rng = np.random.default_rng(3)
+    hr = 110 + 50 * np.sin(np.arange(seconds) / 40) + rng.integers(-5, 6, seconds)
+    return np.repeat(hr.astype(np.int16), FPS)
+
+
+def test_heartbeat_track_matches_the_scalar_loop():
+    # Long enough to cross many EMA blocks
+    target_hr = _target_hr(600)
+
+    scale, heart_idx, smoothed, phase = heartbeat_track(target_hr, 1.0 / FPS)
+    expected_scale, expected_smoothed, expected_phase = _scalar_heartbeat(target_hr.tolist(), 1.0 / FPS)
+
+    np.testing.assert_allclose(smoothed, expected_smoothed, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(phase, expected_phase, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(scale, expected_scale, rtol=0, atol=1e-8)
+    np.testing.assert_array_equal(heart_idx, heart_index(expected_scale))
+
+
+def test_heartbeat_track_continues_from_its_last_state():
+    target_hr = _target_hr(60)
+    split = 1000
+
+    whole = heartbeat_track(target_hr, 1.0 / FPS)
+    _, _, smoothed, phase = heartbeat_track(target_hr[:split], 1.0 / FPS)
+    rest = heartbeat_track(target_hr[split:], 1.0 / FPS, smoothed[-1], phase[-1])
+
+    for whole_series, rest_series in zip(whole, rest):
+        np.testing.assert_allclose(whole_series[split:], rest_series, rtol=0, atol=1e-9)
+
+
+def test_heartbeat_track_of_no_frames():
+    scale, heart_idx, smoothed, phase = heartbeat_track(np.empty(0), 1.0 / FPS)
+    assert len(scale) == len(heart_idx) == len(smoothed) == len(phase) == 0
+
+
+def test_resample_hr_holds_each_sample():
+    target_hr, shown_hr, opacity = resample_hr(SECONDS, HEART_RATE, "hold", "freeze")
+
+    latest = np.searchsorted(SECONDS, FRAME_SECONDS, side="right") - 1
+    np.testing.assert_array_equal(target_hr, HEART_RATE[latest])
+    np.testing.assert_array_equal(shown_hr, target_hr)
+    assert (opacity == 1.0).all()
+
+
+def test_resample_hr_interpolates_but_not_across_a_dropout():
+    target_hr, _, _ = resample_hr(SECONDS, HEART_RATE, "linear", "freeze")
+
+    assert target_hr[FPS // 2] == 105
+    assert (target_hr[(FRAME_SECONDS >= 3) & (FRAME_SECONDS < 10)] == 130).all()
+    assert target_hr[10 * FPS + FPS // 3] == 92
+
+
+@pytest.mark.parametrize("interpolation", ["hold", "linear"])
+@pytest.mark.parametrize("gap_policy", ["freeze", "dashes", "fade"])
+def test_resample_hr_gap_policies(interpolation, gap_policy):
+    target_hr, shown_hr, opacity = resample_hr(SECONDS, HEART_RATE, interpolation, gap_policy)
+    frozen, _, _ = resample_hr(SECONDS, HEART_RATE, interpolation, "freeze")
+
+    assert len(target_hr) == len(FRAME_SECONDS)
+    # The heartbeat follows the last value whatever the overlay shows
+    np.testing.assert_array_equal(target_hr, frozen)
+    np.testing.assert_array_equal(shown_hr[~IN_GAP], target_hr[~IN_GAP])
+    assert (opacity[~IN_GAP] == 1.0).all()
+
+    if gap_policy == "dashes":
+        assert (shown_hr[IN_GAP] == NO_READING).all()
+    else:
+        assert (shown_hr[IN_GAP] == 130).all()
+
+    if gap_policy == "fade":
+        expected = np.clip(1.0 - (FRAME_SECONDS[IN_GAP] - (3 + GAP_SECONDS)) / FADE_SECONDS, 0.0, 1.0)
+        np.testing.assert_allclose(opacity[IN_GAP], expected, atol=1e-6)
+        assert opacity[IN_GAP][-1] == 0.0
+    else:
+        assert (opacity == 1.0).all()
+
+
+def test_resample_hr_starts_a_gap_at_its_marker():
+    _, shown_hr, _ = resample_hr(SECONDS, HEART_RATE, "hold", "dashes", gap_markers=[2.5])
+
+    marked = (FRAME_SECONDS >= 2.5) & (FRAME_SECONDS < 3)
+    assert (shown_hr[marked] == NO_READING).all()
+    assert (shown_hr[(FRAME_SECONDS >= 3) & ~IN_GAP & (FRAME_SECONDS < 10)] == 130).all()
+
+
+def test_resample_hr_builds_any_frame_range():
+    whole = resample_hr(SECONDS, HEART_RATE, "linear", "fade")
+    part = resample_hr(SECONDS, HEART_RATE, "linear", "fade", frames=(4 * FPS, 11 * FPS))
+
+    for whole_series, part_series in zip(whole, part):
+        np.testing.assert_array_equal(whole_series[4 * FPS:11 * FPS], part_series)
@@ -0,0 +1,277 @@
+import av
+import shutil
+from fractions import Fraction
+from pathlib import Path
+
+# ============================================================
+# ENCODER BACKENDS
+# ============================================================
+# Every backend keeps the alpha channel. Presets trade encode speed against file size,
+# each backend has a default_preset used when none is given.
+DEFAULT_ENCODER = "prores"
+FFMPEG_QP2LAMBDA = 118  # global_quality units per quantizer step
+
+
+class EncoderBackend:
+    """
+    An alpha-capable codec in a container that takes whole files per render.
+    pix_fmt is the format frames must be packed in. thread_type is how the codec can
+    spread one stream over threads ("FRAME", "SLICE", "AUTO") or None if it can't.
+    """
+
+    def __init__(self, codec, suffix, pix_fmt, presets, default_preset, container_format=None, thread_type=None):
+        self.codec = codec
+        self.suffix = suffix
+        self.pix_fmt = pix_fmt
+        self.presets = presets
+        self.default_preset = default_preset
+        self.container_format = container_format
+        self.thread_type = thread_type
+
+    def output_path(self, directory, stem):
+        return Path(directory) / f"{stem}{self.suffix}"
+
+    def segment_path(self, output_file, tmp_dir, index):
+        return Path(tmp_dir) / f"{index:05d}{self.suffix}"
+
+    def open(self, output_file, width, height, fps, preset=None, threads=None, start_frame=0):
+        """
+        Returns (container, stream) ready for frames. preset=None is the default_preset.
+        threads=None leaves the codec's default, 0 lets it pick, n uses n threads when
+        the codec can thread at all.
+        """
+        preset = preset or self.default_preset
+        if preset not in self.presets:
+            raise ValueError(f"Unknown preset {preset!r} for {self.codec}, use one of {list(self.presets)}")
+
+        container = self._open_container(output_file, start_frame)
+
+        stream = container.add_stream(self.codec, rate=fps)
+        stream.width = width
+        stream.height = height
+        stream.pix_fmt = self.pix_fmt
+        stream.options = dict(self.presets[preset])
+
+        if threads is not None and self.thread_type is not None:
+            stream.thread_type = self.thread_type
+            stream.thread_count = threads
+
+        return container, stream
+
+    def _open_container(self, output_file, start_frame):
+        return av.open(str(output_file), "w", format=self.container_format)
+
+    def concat(self, segments, output_file, fps):
+        """Joins (segment_file, start_frame) pieces into output_file without re-encoding."""
+        output = av.open(str(output_file), "w", format=self.container_format)
+        out_stream = None
+
+        for segment_file, start_frame in segments:
+            with av.open(str(segment_file)) as segment:
+                in_stream = segment.streams.video[0]
+                if out_stream is None:
+                    out_stream = _copy_stream(output, in_stream)
+
+                offset = round(Fraction(start_frame, fps) / in_stream.time_base)
+
+                for packet in segment.demux(in_stream):
+                    # The demuxer yields an empty packet at end of stream
+                    if packet.dts is None:
+                        continue
+
+                    packet.pts += offset
+                    packet.dts += offset
+                    packet.stream = out_stream
+                    output.mux(packet)
+
+        output.close()
+
+    def split(self, source, source_frames, ranges, segment_files, fps):
+        """
+        Copies the (start_frame, end_frame) ranges of a concatenated source into separate
+        segment files without re-encoding, the inverse of concat. Every range must start on
+        a segment boundary of the source so it starts with a keyframe.
+        """
+        outputs = {}
+
+        with av.open(str(source)) as src:
+            in_stream = src.streams.video[0]
+
+            for packet in src.demux(in_stream):
+                if packet.dts is None:
+                    continue
+
+                frame = round(packet.pts * in_stream.time_base * fps)
+                k = next((k for k, (start, end) in enumerate(ranges) if start <= frame < end), None)
+                if k is None:
+                    continue
+
+                if k not in outputs:
+                    output = av.open(str(segment_files[k]), "w", format=self.container_format)
+                    out_stream = _copy_stream(output, in_stream)
+                    offset = round(Fraction(ranges[k][0], fps) / in_stream.time_base)
+                    outputs[k] = (output, out_stream, offset)
+
+                output, out_stream, offset = outputs[k]
+                packet.pts -= offset
+                packet.dts -= offset
+                packet.stream = out_stream
+                output.mux(packet)
+
+        for output, _, _ in outputs.values():
+            output.close()
+
+
+def _copy_stream(output, in_stream):
+    """An output stream for in_stream's packets, as it was written by the encoder."""
+    out_stream = output.add_stream_from_template(in_stream)
+    # Keep the codec tag, e.g. the mov muxer would turn ProRes 4444 into 422 HQ
+    out_stream.codec_context.codec_tag = in_stream.codec_context.codec_tag
+    # and the stream tags, e.g. WebM's alpha_mode, without which players drop VP9's alpha.
+    # DURATION is the segment's own, the muxer writes the output's
+    for key, value in in_stream.metadata.items():
+        if key.upper() != "DURATION":
+            out_stream.metadata[key] = value
+    return out_stream
+
+
+class RawBackend(EncoderBackend):
+    """Headerless frames back to back; segments are joined by appending their bytes."""
+
+    def concat(self, segments, output_file, fps):
+        with open(output_file, "wb") as output:
+            for segment_file, _ in segments:
+                with open(segment_file, "rb") as segment:
+                    shutil.copyfileobj(segment, output)
+
+    def split(self, source, source_frames, ranges, segment_files, fps):
+        frame_bytes = Path(source).stat().st_size // source_frames
+
+        with open(source, "rb") as src:
+            for (start, end), segment_file in zip(ranges, segment_files):
+                src.seek(start * frame_bytes)
+                with open(segment_file, "wb") as segment:
+                    for _ in range(start, end):
+                        segment.write(src.read(frame_bytes))
+
+
+class SequenceBackend(EncoderBackend):
+    """
+    One image file per frame in a "<stem>_<suffix>" folder, numbered from 0. Segments
+    write straight into the final folder at their start frame, so there is nothing to join.
+    """
+
+    def output_path(self, directory, stem):
+        return Path(directory) / f"{stem}_{self.suffix.lstrip('.')}"
+
+    def segment_path(self, output_file, tmp_dir, index):
+        return output_file
+
+    def _open_container(self, output_file, start_frame):
+        output_file = Path(output_file)
+        output_file.mkdir(parents=True, exist_ok=True)
+        return av.open(
+            str(output_file / f"%06d{self.suffix}"),
+            "w",
+            format="image2",
+            options={"start_number": str(start_frame)}
+        )
+
+    def concat(self, segments, output_file, fps):
+        pass
+
+    def split(self, source, source_frames, ranges, segment_files, fps):
+        pass
+
+
+# Measured with render_benchmark.py on a 10 minute synthetic log (18000 frames, 260x120),
+# one worker on a single core, PyAV 18.1. fps is the whole render, not only the encoder;
+# "max err" is the largest 8-bit RGBA difference from the exact composition over a 1 minute log.
+#
+#   encoder  preset    fps       output     max err
+#   prores   fast      486 fps   515 MB     5
+#   prores   quality   131 fps   586 MB     3
+#   prores   small     528 fps   406 MB     16
+#   qtrle    default   1090 fps  41 MB      0
+#   vp9      fast      619 fps   4.6 MB     206*
+#   vp9      balanced  99 fps    2.8 MB     158*
+#   vp9      small     72 fps    2.1 MB     181*
+#   ffv1     fast      366 fps   119 MB     1
+#   ffv1     small     348 fps   109 MB     1
+#   png      fast      626 fps   98 MB      0
+#   png      balanced  356 fps   75 MB      0
+#   png      small     123 fps   70 MB      0
+#   rgba     default   1259 fps  2246 MB    0
+#
+# * premultiplied, on the edges of the colored digits where 4:2:0 chroma smears the color;
+#   alpha itself is off by at most 52 / 71 / 65. Decoded with libvpx-vp9: FFmpeg's own vp9
+#   decoder drops the alpha, and so do browsers and OBS unless the WebM has its alpha_mode
+#   tag, which these numbers can't show (see _copy_stream).
+# Encoder threads (threads=) were not measured, the machine had one core.
+ENCODERS = {
+    # Edit-friendly, what every NLE takes. "quality" is ProRes' own rate control; the
+    # others force a quantizer, which skips the rate control search and encodes much faster
+    "prores": EncoderBackend(
+        "prores_ks", ".mov", "yuva444p10le",
+        {
+            "fast": {"profile": "4444", "flags": "+qscale", "global_quality": str(2 * FFMPEG_QP2LAMBDA)},
+            "quality": {"profile": "4444"},
+            "small": {"profile": "4444", "flags": "+qscale", "global_quality": str(6 * FFMPEG_QP2LAMBDA)},
+        },
+        "quality",
+        thread_type="FRAME",
+    ),
+    # QuickTime Animation: lossless 8-bit RLE, small for a mostly static overlay
+    "qtrle": EncoderBackend(
+        "qtrle", ".mov", "argb",
+        {"default": {}},
+        "default",
+    ),
+    # VP9 with alpha in WebM, for browsers and OBS media sources. Lossy, 4:2:0 chroma
+    "vp9": EncoderBackend(
+        "libvpx-vp9", ".webm", "yuva420p",
+        {
+            "fast": {"deadline": "realtime", "cpu-used": "8", "crf": "32", "b": "0", "row-mt": "1"},
+            "balanced": {"deadline": "good", "cpu-used": "4", "crf": "32", "b": "0", "row-mt": "1"},
+            "small": {"deadline": "good", "cpu-used": "1", "crf": "40", "b": "0", "row-mt": "1"},
+        },
+        "fast",
+        thread_type="AUTO",
+    ),
+    # FFV1: lossless 10-bit archive copy
+    "ffv1": EncoderBackend(
+        "ffv1", ".mkv", "yuva444p10le",
+        {
+            "fast": {"level": "3", "context": "0", "slices": "4"},
+            "small": {"level": "3", "context": "1", "slices": "4"},
+        },
+        "fast",
+        container_format="matroska",
+        thread_type="SLICE",
+    ),
+    # PNG prediction filters only cost time here: the flat overlay compresses better without
+    "png": SequenceBackend(
+        "png", ".png", "rgba",
+        {
+            "fast": {"compression_level": "1", "pred": "none"},
+            "balanced": {"compression_level": "6", "pred": "none"},
+            "small": {"compression_level": "9", "pred": "none"},
+        },
+        "balanced",
+        thread_type="FRAME",
+    ),
+    # Raw RGBA frames for piping into other tools: WIDTH * HEIGHT * 4 bytes each
+    "rgba": RawBackend(
+        "rawvideo", ".rgba", "rgba",
+        {"default": {}},
+        "default",
+        container_format="rawvideo",
+    ),
+}
+
+
+def get_encoder(name):
+    try:
+        return ENCODERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown encoder {name!r}, use one of {list(ENCODERS)}") from None
@@ -1,21 +1,44 @@
+import os
+import threading
 from PyQt5.QtCore import QThread, pyqtSignal
-from video_renderer import render_video
 
 class VideoRenderWorker(QThread):
     started = pyqtSignal(str)
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
+    progress = pyqtSignal(dict)  # render_video progress metrics, see RenderProgress
+    cancelled = pyqtSignal()
 
-    def __init__(self, csv_path: str, hr_interval_1: int, hr_interval_2: int):
+    def __init__(self, csv_path: str, hr_interval_1: int, hr_interval_2: int, workers: int = None, **render_options):
         super().__init__()
         self.csv_path = csv_path
         self.hr_interval_1 = hr_interval_1
         self.hr_interval_2 = hr_interval_2
+        self.workers = workers or os.cpu_count() or 1
+        self.render_options = render_options  # extra render_video keywords, e.g. gap_policy
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Stops the render within a frame; its finished segments are kept for a resume."""
+        self.cancel_event.set()
 
     def run(self):
+        # The render stack (av, numpy, PIL) loads on the first render, not with the GUI
+        from video_renderer import RenderCancelled, render_video
+
         try:
             self.started.emit(self.csv_path)
-            output_path = render_video(self.csv_path, self.hr_interval_1, self.hr_interval_2)
+            output_path = render_video(
+                self.csv_path,
+                self.hr_interval_1,
+                self.hr_interval_2,
+                workers=self.workers,
+                progress_callback=self.progress.emit,
+                cancel_event=self.cancel_event,
+                **self.render_options
+            )
             self.finished.emit(output_path)
+        except RenderCancelled:
+            self.cancelled.emit()
         except Exception as e:
-            self.error.emit(str(e))
+            self.error.emit(str(e))
\ No newline at end of file
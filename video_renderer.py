@@ -1,19 +1,30 @@
 import av
+import hashlib
+import json
 import math
+import multiprocessing
+import os
+import queue
+import shutil
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 import numpy as np
-import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from fractions import Fraction
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 
+from hr_log import LogIndex, read_hr_log
+from video_encoders import DEFAULT_ENCODER, get_encoder
+
 # ============================================================
 # CONFIG
 # ============================================================
 FPS = 30
 WIDTH, HEIGHT = 260, 120
 
-PIXEL_FORMAT = "yuva444p10le"
-PRORES_PROFILE = "4444"
-PRORES_QSCALE = "9"
+PIXEL_FORMAT = "yuva444p10le"  # compositing format, see YuvaCompositor; encoders are in video_encoders
 
 BG_COLOR = (30, 30, 30)
 BG_ALPHA = 200
@@ -21,6 +32,7 @@ BG_ALPHA = 200
 FONT_SIZE = 70
 TEXT_ANCHOR = "lm"
 TEXT_X_OFFSET = 38
+TEXT_WIDTH = 200  # canvas of the PIL text images, see OverlayAssets.get_text_image
 
 HEART_SIZE = 50
 HEART_X_CENTER = 40
@@ -30,6 +42,12 @@ LINE_WIDTH = 10
 PADDING = 10
 SLANT = 40
 
+SPARKLINE_X, SPARKLINE_Y = 10, 93  # HR history band inside the trapezoid, below the heart and the text
+SPARKLINE_WIDTH, SPARKLINE_HEIGHT = 190, 15
+SPARKLINE_LINE_WIDTH = 2
+SPARKLINE_SECONDS = 120  # history across the band, see Sparkline
+SPARKLINE_MIN_SPAN = 20  # bpm the band's height covers at least, so a steady rate isn't drawn as noise
+
 BEAT_SCALE = 0.28
 HR_SMOOTHING = 0.15
 
@@ -43,203 +61,1553 @@ DUB_DURATION = 0.10
 HR_RATE_MULTIPLIER = 1.5
 MIN_HR = 40
 
+BEAT_SOURCE = "synthetic"  # "synthetic" (HR driven phase) or "rr" (measured beat times)
+MAX_BEAT_INTERVAL = 2.0  # longer RR gaps are missed beats, the synthetic phase covers them
+
+SCALE_STEPS = 64
+
+SAMPLE_PERIOD = 1.0  # seconds covered by the last log row
+INTERPOLATION = "hold"  # "hold" or "linear"
+GAP_POLICY = "freeze"  # "freeze", "fade" or "dashes"
+GAP_SECONDS = 3.0  # a longer silence between samples is a dropout
+FADE_SECONDS = 1.0
+OPACITY_STEPS = 32
+NO_READING = 0  # shown_hr value drawn as "--"
+NO_READING_TEXT = "--"
+GLYPHS = "".join(dict.fromkeys("0123456789" + NO_READING_TEXT))  # every character the text can have
+
+FRAME_CACHE_BYTES = 256 * 1024 * 1024  # converted frames kept for reuse per encoder
+
+SEGMENT_SECONDS = 60  # timeline length rendered by one worker task
+CLIP_PREROLL_SECONDS = 10  # log read around a clip, to warm up the heartbeat going in and find beats going out
+DEFAULT_WORKERS = 1
+
+PROGRESS_INTERVAL = 0.5  # seconds between progress callbacks
+CHECKPOINT_FILE = "checkpoint.json"  # finished segments of an interrupted render, see RenderCheckpoint
+RENDER_CACHE_VERSION = 1  # bump when a drawing change alters frames that no constant below covers
+
+OUTPUT_DIR = "heartrate_overlay/videos"
 FONT_PATH = "heartrate_overlay/assets/Fredoka-Bold.ttf"
 HEART_IMAGE_PATH = "heartrate_overlay/assets/heart.png"
 
+# Everything above that changes the frames, part of the render cache key with the assets' content
+CACHE_KEY_CONSTANTS = (
+    "FPS", "WIDTH", "HEIGHT", "BG_COLOR", "BG_ALPHA", "FONT_SIZE", "TEXT_ANCHOR", "TEXT_X_OFFSET",
+    "HEART_SIZE", "HEART_X_CENTER", "LINE_COLOR", "LINE_WIDTH", "PADDING", "SLANT", "SPARKLINE_X", "SPARKLINE_Y",
+    "SPARKLINE_WIDTH", "SPARKLINE_HEIGHT", "SPARKLINE_LINE_WIDTH", "SPARKLINE_SECONDS", "SPARKLINE_MIN_SPAN",
+    "BEAT_SCALE", "HR_SMOOTHING", "LUB_RISE_END", "LUB_DECAY_END", "LUB_DECAY_STRENGTH", "DUB_START", "DUB_DURATION",
+    "HR_RATE_MULTIPLIER", "MIN_HR", "MAX_BEAT_INTERVAL", "SCALE_STEPS", "SAMPLE_PERIOD", "GAP_SECONDS",
+    "FADE_SECONDS", "OPACITY_STEPS", "NO_READING", "NO_READING_TEXT", "SEGMENT_SECONDS", "RENDER_CACHE_VERSION",
+)
+
 # ============================================================
 # PUBLIC ENTRY POINT
 # ============================================================
-def render_video(input_csv: str, hr_interval_1, hr_interval_2) -> str:
+def render_video(
+    input_csv: str,
+    hr_interval_1,
+    hr_interval_2,
+    workers: int = DEFAULT_WORKERS,
+    stats: dict = None,
+    interpolation: str = INTERPOLATION,
+    gap_policy: str = GAP_POLICY,
+    beat_source: str = BEAT_SOURCE,
+    progress_callback=None,
+    encoder: str = DEFAULT_ENCODER,
+    preset: str = None,
+    threads: int = None,
+    cancel_event=None,
+    resume: bool = True,
+    cache: bool = True,
+    output_dir: str = OUTPUT_DIR,
+    scale: float = 1.0,
+    sparkline: bool = False,
+    clip_start: float = None,
+    clip_end: float = None,
+    clip_duration: float = None,
+) -> str:
+    """
+    Renders the heart rate log (.csv or .hrb) to an overlay video in output_dir, named after
+    the log, and returns the output path. scale sizes the overlay from its WIDTH x HEIGHT
+    design (see OverlayLayout), e.g. 4.0 for 4K productions. sparkline adds the scrolling
+    heart rate history below the number (see Sparkline).
+    encoder and preset pick the output format from video_encoders.ENCODERS (ProRes 4444 by
+    default, preset None is the encoder's default); threads is the encoder's own thread
+    count per worker, None for its default.
+    The log is resampled onto the frame grid from its timestamps, see resample_hr.
+    clip_start and clip_end (or clip_duration), in seconds from the log's first sample,
+    render only that part of the timeline into an output named after it. The log is then
+    seeked through its LogIndex and only the clip's frames are rendered, so it costs time
+    for its own length. They are a full render's frames: the heartbeat is warmed up over
+    CLIP_PREROLL_SECONDS before the clip and starts in the same phase, to float rounding
+    (see heartbeat_state). A clip's sparkline spans the range of the history it reads
+    rather than the whole log's.
+    With beat_source="rr" the heart pulses on the logged RR beat times where there are any.
+    If a stats dict is passed it is filled with frame cache counters and the seconds spent
+    in each stage (summed over the workers for the encode stages, see StageTimer).
+    progress_callback(metrics) is called from this thread at most every PROGRESS_INTERVAL,
+    see RenderProgress for the metrics.
+
+    The timeline is encoded in SEGMENT_SECONDS segments, checkpointed as they finish (see
+    RenderCheckpoint). Setting cancel_event (a threading.Event) stops the render with
+    RenderCancelled; rendering the same log with the same settings again resumes from the
+    finished segments unless resume is False.
+
+    With cache on, an output already rendered from the same log content and settings is
+    returned as is, and after the log changed (e.g. it grew) only the segments whose frames
+    changed are encoded again, the rest is copied from the previous output (see RenderCache).
+    """
+    timer = StageTimer()
+
     input_csv = Path(input_csv)
 
-    output_dir = Path("heartrate_overlay/videos")
+    output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    output_file = output_dir / f"{input_csv.stem}.mov"
+    clip = None
+    output_stem = input_csv.stem
+    if clip_start is not None or clip_end is not None or clip_duration is not None:
+        with timer("seek"), LogIndex(input_csv) as index:
+            clip = clip_frames(index, clip_start, clip_end, clip_duration)
+        output_stem += f"_{_timecode(clip[0])}-{_timecode(clip[1])}"
+
+    backend = get_encoder(encoder)
+    output_file = backend.output_path(output_dir, output_stem)
+    encode_options = (encoder, preset or backend.default_preset, threads)
+
+    config_key = render_config_key(hr_interval_1, hr_interval_2, interpolation, gap_policy, beat_source,
+                                   encode_options, scale, sparkline, clip)
+    render_cache = RenderCache(output_file) if cache else None
+
+    if render_cache is not None:
+        with timer("cache"):
+            log_digest = file_digest(input_csv)
+        if render_cache.is_current(config_key, log_digest):
+            if progress_callback:
+                frames = render_cache.total_frames
+                RenderProgress(frames, progress_callback, resumed_frames=frames).update(frames, 0, 0, 0, force=True)
+            if stats is not None:
+                stats.update(
+                    cache_hit=True,
+                    total_frames=render_cache.total_frames,
+                    resumed_frames=0,
+                    reused_frames=render_cache.total_frames
+                )
+            _record_stats(stats, [], timer)
+            return str(output_file)
 
     # ========================================================
     # LOAD DATA
     # ========================================================
-    df = pd.read_csv(input_csv)
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    layout = OverlayLayout(scale)
 
-    hr_array = df["heart_rate"].clip(lower=MIN_HR).to_numpy(dtype=np.int16)
+    # A clip is built from preroll frames of the timeline before it on, the full render from frame 0
+    first_frame, preroll, frames, before = 0, 0, None, None
+    with timer("load"):
+        if clip is None:
+            log = read_hr_log(input_csv)
+        else:
+            first_frame = clip[0]
+            preroll = clip_preroll(first_frame, layout if sparkline else None)
+            frames = (first_frame - preroll, clip[1])
+            log, before = _read_clip(input_csv, frames, interpolation, gap_policy)
+        hr_array = np.maximum(log.heart_rate, MIN_HR)
 
-    duration_seconds = len(hr_array)
-    total_frames = int(duration_seconds * FPS)
-    dt = 1.0 / FPS
+    with timer("resample"):
+        target_hr, shown_hr, opacity = resample_hr(
+            log.seconds, hr_array, interpolation, gap_policy, log.gap_seconds, frames
+        )
+    total_frames = len(target_hr) - preroll
 
-    heart_img = Image.open(HEART_IMAGE_PATH).convert("RGBA")
-    font = ImageFont.truetype(FONT_PATH, FONT_SIZE)
+    sparkline_columns = shown_hr[::layout.sparkline_column_frames] if sparkline else None
 
     # ========================================================
-    # HELPERS
+    # HEARTBEAT
     # ========================================================
-    def hr_to_color(hr):
-        if hr < hr_interval_1:
-            return (93, 251, 8)
-        if hr < hr_interval_2:
-            return (250, 186, 9)
-        return (249, 35, 4)
+    with timer("heartbeat"):
+        smoothed_hr, phase = None, 0.0
+        if first_frame:
+            smoothed_hr, phase = heartbeat_state(target_hr[:preroll], *before)
+        target_hr, shown_hr, opacity = target_hr[preroll:], shown_hr[preroll:], opacity[preroll:]
+
+        _, heart_idx, smoothed, beat_phase = heartbeat_track(target_hr, 1.0 / FPS, smoothed_hr, phase)
 
-    def draw_rounded_line(draw, p1, p2, width, color):
-        draw.line([p1, p2], fill=color, width=width)
-        r = width // 2 - 1
-        for x, y in (p1, p2):
-            draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+        if beat_source == "rr" and log.has_rr:
+            frame_seconds = np.arange(first_frame, first_frame + total_frames) / FPS
+            beat_phase = rr_beat_phase(frame_seconds, log.beat_seconds(), beat_phase)
+            heart_idx = heart_index(1.0 + BEAT_SCALE * heartbeat_pulse(beat_phase))
 
     # ========================================================
-    # TRAPEZOID MASK
+    # ENCODE (CHECKPOINTED SEGMENTS)
     # ========================================================
-    def create_trapezoid_mask():
-        mask = Image.new("L", (WIDTH, HEIGHT), 0)
-        draw = ImageDraw.Draw(mask)
+    segments = split_segments(total_frames, SEGMENT_SECONDS * FPS)
+
+    # Each segment's heartbeat state going in (smoothed hr and beat phase of the frame before)
+    # and a digest of its frames, which is what finished segments are matched on
+    opacity_level = np.rint(opacity * OPACITY_STEPS)
+    segment_states = [
+        [
+            start,
+            end,
+            float(smoothed[start - 1]) if start else None,
+            float(beat_phase[start - 1]) if start else None,
+            segment_digest(
+                shown_hr[start:end], heart_idx[start:end], opacity_level[start:end],
+                *(sparkline_history(sparkline_columns, preroll + start, preroll + end, layout) if sparkline else ())
+            ),
+        ]
+        for start, end in segments
+    ]
+    work_dir = output_file.with_name(f".{output_file.name}.parts")
+    checkpoint = RenderCheckpoint(work_dir, config_key, segment_states, resume)
+    segment_files = [backend.segment_path(output_file, work_dir, i) for i in range(len(segments))]
+
+    resumed_frames = sum(segments[i][1] - segments[i][0] for i in checkpoint.completed)
 
-        top = PADDING - (LINE_WIDTH // 2)
-        bottom = HEIGHT - PADDING + (LINE_WIDTH // 2)
-        right = WIDTH - PADDING
+    reused = []
+    if render_cache is not None:
+        reused = [i for i in render_cache.matching_segments(config_key, segment_states) if i not in checkpoint.completed]
+        if reused:
+            with timer("reuse"):
+                backend.split(
+                    output_file,
+                    render_cache.total_frames,
+                    [segments[i] for i in reused],
+                    [segment_files[i] for i in reused],
+                    FPS
+                )
+            for index in reused:
+                checkpoint.mark_done(index)
+        # The output is about to change, until it's done it matches no manifest
+        render_cache.invalidate()
+    else:
+        # Also without the cache: a manifest left by an earlier render would describe the old output
+        RenderCache(output_file).invalidate()
+
+    todo = [i for i in range(len(segments)) if i not in checkpoint.completed]
+    reused_frames = sum(segments[i][1] - segments[i][0] for i in reused)
+    skipped_frames = resumed_frames + reused_frames
+
+    progress = None
+    if progress_callback:
+        progress = RenderProgress(total_frames, progress_callback, resumed_frames=skipped_frames)
+
+    if workers <= 1 or len(todo) <= 1:
+        with timer("assets"):
+            compositor = YuvaCompositor(
+                OverlayAssets(hr_interval_1, hr_interval_2, layout), sparkline_columns, preroll
+            )
+        frame_cache = FrameCache()
+        frames_before = skipped_frames
+        for index in todo:
+            start, end = segments[index]
+            encode_frames(
+                segment_files[index], compositor, shown_hr[start:end], heart_idx[start:end], opacity[start:end],
+                cache=frame_cache, timer=timer, encode_options=encode_options, start_frame=start,
+                progress=progress.offset(frames_before) if progress else None,
+                cancel_event=cancel_event
+            )
+            checkpoint.mark_done(index)
+            frames_before += end - start
+        cache_counts = [(frame_cache.hits, frame_cache.misses)]
+    else:
+        cache_counts = _render_segments_in_pool(
+            workers, hr_interval_1, hr_interval_2, scale, encode_options, todo, segments, segment_files,
+            shown_hr, heart_idx, opacity, checkpoint, timer, progress, cancel_event, sparkline_columns, preroll
+        )
 
-        draw.polygon(
-            [(0, top), (right, top), (right - SLANT, bottom), (0, bottom)],
-            fill=255
+    with timer("concat"):
+        backend.concat(
+            [(path, start) for path, (start, _) in zip(segment_files, segments)],
+            output_file,
+            FPS
         )
-        return mask
+    checkpoint.remove()
+    if render_cache is not None:
+        render_cache.store(config_key, log_digest, total_frames, segment_states)
 
-    trapezoid_mask = create_trapezoid_mask()
+    if stats is not None:
+        stats["cache_hit"] = False
+        stats["total_frames"] = total_frames
+        stats["resumed_frames"] = resumed_frames
+        stats["reused_frames"] = reused_frames
+    _record_stats(stats, cache_counts, timer)
+    return str(output_file)
 
-    # ========================================================
-    # STATIC BACKGROUND + BORDER (CACHED)
-    # ========================================================
-    alpha = trapezoid_mask.point(lambda a: a * BG_ALPHA // 255)
-    static_bg = Image.new("RGBA", (WIDTH, HEIGHT), BG_COLOR + (0,))
-    static_bg.putalpha(alpha)
 
-    frame_base = static_bg.copy()
-    base_draw = ImageDraw.Draw(frame_base)
+def _render_segments_in_pool(workers, hr_interval_1, hr_interval_2, scale, encode_options, todo, segments,
+                             segment_files, shown_hr, heart_idx, opacity, checkpoint, timer, progress, cancel_event,
+                             sparkline_columns=None, sparkline_offset=0):
+    """Renders the todo segments in worker processes, checkpointing each as it finishes."""
+    progress_queue = multiprocessing.Queue() if progress else None
+    worker_cancel = multiprocessing.Event()
+    collector = _SegmentProgressCollector(progress, progress_queue, segments, checkpoint.completed)
+    cache_counts = []
 
-    top = PADDING - (LINE_WIDTH // 2)
-    bottom = HEIGHT - PADDING + (LINE_WIDTH // 2)
-    right = WIDTH - PADDING
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(todo)),
+        initializer=_init_segment_worker,
+        initargs=(
+            hr_interval_1, hr_interval_2, progress_queue, encode_options, worker_cancel, scale,
+            sparkline_columns, sparkline_offset
+        ),
+    ) as pool:
+        jobs = {
+            pool.submit(
+                _render_segment,
+                str(segment_files[index]),
+                shown_hr[start:end],
+                heart_idx[start:end],
+                opacity[start:end],
+                index,
+                start
+            ): index
+            for index, (start, end) in ((i, segments[i]) for i in todo)
+        }
+        pending = set(jobs)
 
-    draw_rounded_line(base_draw, (0, top), (right, top), LINE_WIDTH, LINE_COLOR)
-    draw_rounded_line(base_draw, (right, top), (right - SLANT, bottom), LINE_WIDTH, LINE_COLOR)
-    draw_rounded_line(base_draw, (0, bottom), (right - SLANT, bottom), LINE_WIDTH, LINE_COLOR)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
 
-    # ========================================================
-    # HEART SCALE CACHE
-    # ========================================================
-    SCALE_STEPS = 64
-    heart_cache = {}
+                for job in done:
+                    hits, misses, stage_seconds = job.result()
+                    timer.merge(stage_seconds)
+                    cache_counts.append((hits, misses))
+                    checkpoint.mark_done(jobs[job])
+                    collector.finished(jobs[job], hits, misses)
 
-    for i in range(SCALE_STEPS):
-        scale = 1.0 + BEAT_SCALE * (i / (SCALE_STEPS - 1))
-        size = int(HEART_SIZE * scale)
-        heart_cache[i] = heart_img.resize((size, size), Image.LANCZOS)
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RenderCancelled()
+                collector.poll(force=not pending)
+        except BaseException:
+            # Stop the running segments too, the finished ones stay checkpointed
+            worker_cancel.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
 
-    def get_cached_heart(scale):
-        idx = int((scale - 1.0) / BEAT_SCALE * (SCALE_STEPS - 1))
-        idx = max(0, min(SCALE_STEPS - 1, idx))
-        return heart_cache[idx]
+    return cache_counts
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+def draw_rounded_line(draw, p1, p2, width, color):
+    draw.line([p1, p2], fill=color, width=width)
+    r = width // 2 - 1
+    for x, y in (p1, p2):
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+
+
+def _record_stats(stats, cache_counts, timer):
+    if stats is None:
+        return
+    hits = sum(h for h, _ in cache_counts)
+    misses = sum(m for _, m in cache_counts)
+    stats["frame_cache_hits"] = hits
+    stats["frame_cache_misses"] = misses
+    stats["frame_cache_hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+    stats["stage_seconds"] = dict(timer.seconds)
+
+
+class StageTimer:
+    """
+    Wall time spent in each named stage, summed over every entry: with timer("encode"): ...
+    Timers of worker processes are merged in, so encode stages can add up to more than the
+    elapsed time when segments render in parallel.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start
+
+    def merge(self, seconds):
+        for stage, value in seconds.items():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + value
+
+
+def split_segments(total_frames, segment_frames):
+    """Splits [0, total_frames) into consecutive (start, end) frame ranges."""
+    return [
+        (start, min(start + segment_frames, total_frames))
+        for start in range(0, total_frames, segment_frames)
+    ]
+
+
+# ============================================================
+# CLIPS (TIME RANGES OF THE TIMELINE)
+# ============================================================
+def clip_frames(index, clip_start=None, clip_end=None, clip_duration=None):
+    """
+    The (first, end) frames of a log's timeline a clip covers, from its start and its end
+    or duration in seconds from the first sample (an open end runs to the end of the log).
+    index is the log's LogIndex.
+    """
+    if clip_end is not None and clip_duration is not None:
+        raise ValueError("Pass the clip's end or its duration, not both")
+
+    total_frames = int(round(((index.last_ms - index.first_ms) / 1000.0 + SAMPLE_PERIOD) * FPS))
+    first = max(0, int(round((clip_start or 0.0) * FPS)))
+    if clip_duration is not None:
+        end = first + int(round(clip_duration * FPS))
+    elif clip_end is not None:
+        end = int(round(clip_end * FPS))
+    else:
+        end = total_frames
+
+    if first >= total_frames:
+        raise ValueError(f"Clip starts at {_timecode(first)}, past the end of the log at {_timecode(total_frames)}")
+    if end <= first:
+        raise ValueError(f"Clip ends at {_timecode(end)}, before it starts at {_timecode(first)}")
+    return first, min(end, total_frames)
+
+
+def clip_preroll(first_frame, layout=None):
+    """
+    Frames of the timeline read before a clip's first_frame: CLIP_PREROLL_SECONDS to warm
+    up the heartbeat, and with a sparkline layout a full band of history besides, starting
+    on a sparkline column so the columns line up with a full render's.
+    """
+    preroll = CLIP_PREROLL_SECONDS * FPS
+    if layout is not None:
+        preroll = max(preroll, (layout.sparkline_width + 1) * layout.sparkline_column_frames)
+
+    start = max(0, first_frame - preroll)
+    if layout is not None:
+        start -= start % layout.sparkline_column_frames
+    return first_frame - start
+
+
+def _read_clip(path, frames, interpolation, gap_policy):
+    """
+    Reads what the frames [first, end) of a log's timeline depend on through its LogIndex:
+    the rows around them, plus CLIP_PREROLL_SECONDS past the end for the beats logged after
+    it. Before first only the heart rates are read, for what heartbeat_state needs of them.
+    Returns (log, (sum of target_hr before first, target_hr of frame 0)).
+    """
+    first, end = frames
+    with LogIndex(path) as index:
+        def frame_ms(frame):
+            return index.first_ms + frame * 1000 // FPS
+
+        log = index.read_range(frame_ms(first), frame_ms(end) + CLIP_PREROLL_SECONDS * 1000)
+        if first == 0:
+            return log, (0, None)
+        before = index.read_range(index.first_ms, frame_ms(first), rr=False)
+
+    target_before, _, _ = resample_hr(
+        before.seconds, np.maximum(before.heart_rate, MIN_HR), interpolation, gap_policy, before.gap_seconds,
+        (0, first)
+    )
+    return log, (int(target_before.sum()), int(target_before[0]))
+
+
+def _timecode(frame):
+    seconds = frame // FPS
+    return f"{seconds // 3600}h{seconds // 60 % 60:02d}m{seconds % 60:02d}s"
+
+
+# ============================================================
+# LAYOUT (RESOLUTION SCALING)
+# ============================================================
+class OverlayLayout:
+    """
+    Overlay geometry at a scale factor of the CONFIG sizes, which are for WIDTH x HEIGHT.
+    Every length is scaled and rounded, the frame to even sizes for 4:2:0 encoders, so
+    scale 1.0 is exactly the CONFIG layout.
+    """
+
+    def __init__(self, scale=1.0):
+        if scale <= 0:
+            raise ValueError(f"Scale must be positive, got {scale}")
+        self.scale = scale
+        self.width = 2 * max(1, round(WIDTH * scale / 2))
+        self.height = 2 * max(1, round(HEIGHT * scale / 2))
+        self.font_size = self._scaled(FONT_SIZE)
+        self.text_x = self._scaled(HEART_SIZE + TEXT_X_OFFSET)
+        self.text_width = self._scaled(TEXT_WIDTH)
+        self.heart_size = self._scaled(HEART_SIZE)
+        self.heart_x_center = self._scaled(HEART_X_CENTER)
+        self.line_width = self._scaled(LINE_WIDTH)
+        self.padding = self._scaled(PADDING)
+        self.slant = self._scaled(SLANT)
+        self.sparkline_x = self._scaled(SPARKLINE_X)
+        self.sparkline_y = self._scaled(SPARKLINE_Y)
+        self.sparkline_width = self._scaled(SPARKLINE_WIDTH)
+        self.sparkline_height = self._scaled(SPARKLINE_HEIGHT)
+        self.sparkline_line_width = self._scaled(SPARKLINE_LINE_WIDTH)
+        # Frames per sparkline column, so the band spans SPARKLINE_SECONDS at any scale
+        self.sparkline_column_frames = max(1, round(SPARKLINE_SECONDS * FPS / self.sparkline_width))
+
+    @classmethod
+    def for_height(cls, height):
+        """The layout whose frame is height pixels tall, e.g. 480 for 4x."""
+        return cls(height / HEIGHT)
+
+    def _scaled(self, length):
+        return max(1, round(length * self.scale))
+
+    def trapezoid(self):
+        """Corners of the frame outline: top left, top right, bottom right, bottom left."""
+        top = self.padding - (self.line_width // 2)
+        bottom = self.height - self.padding + (self.line_width // 2)
+        right = self.width - self.padding
+        return (0, top), (right, top), (right - self.slant, bottom), (0, bottom)
 
-    # ========================================================
-    # TEXT CACHE
-    # ========================================================
-    text_cache = {}
 
-    def get_text_image(hr):
-        if hr not in text_cache:
-            img = Image.new("RGBA", (200, HEIGHT), (0, 0, 0, 0))
+# ============================================================
+# TRAPEZOID MASK
+# ============================================================
+def create_trapezoid_mask(layout=None):
+    layout = layout or OverlayLayout()
+    mask = Image.new("L", (layout.width, layout.height), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.polygon(list(layout.trapezoid()), fill=255)
+    return mask
+
+
+# ============================================================
+# OVERLAY ASSETS (STATIC BACKGROUND, HEART + TEXT CACHES)
+# ============================================================
+class SpriteAtlas:
+    """
+    Sprites shaped (..., h, w) packed top to bottom into one array, rasterized once;
+    atlas[i] is a view of sprite i, so drawing one only touches its own pixels.
+    """
+
+    def __init__(self, sprites):
+        sprites = list(sprites)
+        height = sum(sprite.shape[-2] for sprite in sprites)
+        width = max((sprite.shape[-1] for sprite in sprites), default=0)
+        self.pixels = np.zeros(sprites[0].shape[:-2] + (height, width), dtype=sprites[0].dtype)
+        self.regions = []  # (top, height, width) per sprite
+
+        top = 0
+        for sprite in sprites:
+            h, w = sprite.shape[-2:]
+            self.pixels[..., top:top + h, :w] = sprite
+            self.regions.append((top, h, w))
+            top += h
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __getitem__(self, index):
+        top, h, w = self.regions[index]
+        return self.pixels[..., top:top + h, :w]
+
+
+class OverlayAssets:
+    def __init__(self, hr_interval_1, hr_interval_2, layout=None):
+        self.hr_interval_1 = hr_interval_1
+        self.hr_interval_2 = hr_interval_2
+        self.layout = layout or OverlayLayout()
+
+        self.font = ImageFont.truetype(FONT_PATH, self.layout.font_size)
+        self.frame_base = self._create_frame_base(self.layout)
+        self.heart_cache = self._create_heart_cache(self.layout)
+        self.glyph_atlas, self.glyph_offsets = self._create_glyph_atlas(self.font)
+        self.text_cache = {}
+
+    @staticmethod
+    def _create_frame_base(layout):
+        trapezoid_mask = create_trapezoid_mask(layout)
+
+        alpha = trapezoid_mask.point(lambda a: a * BG_ALPHA // 255)
+        static_bg = Image.new("RGBA", (layout.width, layout.height), BG_COLOR + (0,))
+        static_bg.putalpha(alpha)
+
+        frame_base = static_bg.copy()
+        base_draw = ImageDraw.Draw(frame_base)
+
+        top_left, top_right, bottom_right, bottom_left = layout.trapezoid()
+        draw_rounded_line(base_draw, top_left, top_right, layout.line_width, LINE_COLOR)
+        draw_rounded_line(base_draw, top_right, bottom_right, layout.line_width, LINE_COLOR)
+        draw_rounded_line(base_draw, bottom_left, bottom_right, layout.line_width, LINE_COLOR)
+        return frame_base
+
+    @staticmethod
+    def _create_heart_cache(layout):
+        heart_img = Image.open(HEART_IMAGE_PATH).convert("RGBA")
+        heart_cache = {}
+
+        for i in range(SCALE_STEPS):
+            scale = 1.0 + BEAT_SCALE * (i / (SCALE_STEPS - 1))
+            size = int(layout.heart_size * scale)
+            heart_cache[i] = heart_img.resize((size, size), Image.LANCZOS)
+        return heart_cache
+
+    @staticmethod
+    def _create_glyph_atlas(font):
+        """
+        Coverage masks of the GLYPHS packed into a SpriteAtlas, with each mask's offset
+        from the pen position on the baseline. Text assembled from them (see text_mask)
+        matches ImageDraw.text exactly: the glyphs advance by whole pixels.
+        """
+        masks, offsets = [], {}
+        for i, glyph in enumerate(GLYPHS):
+            left, top, right, bottom = font.getbbox(glyph, anchor="ls")
+            mask = Image.new("L", (right - left, bottom - top), 0)
+            ImageDraw.Draw(mask).text((-left, -top), glyph, font=font, fill=255, anchor="ls")
+            masks.append(np.asarray(mask))
+            offsets[glyph] = (i, left, top)
+        return SpriteAtlas(masks), offsets
+
+    def hr_to_color(self, hr):
+        if hr < self.hr_interval_1:
+            return (93, 251, 8)
+        if hr < self.hr_interval_2:
+            return (250, 186, 9)
+        return (249, 35, 4)
+
+    def text_color(self, hr):
+        return LINE_COLOR if hr == NO_READING else self.hr_to_color(hr)
+
+    def text_mask(self, hr):
+        """
+        The hr text as (coverage, x, y): a uint8 mask blitted together from the glyph atlas
+        and where its top left goes in the frame, the same pixels get_text_image draws.
+        """
+        text = NO_READING_TEXT if hr == NO_READING else str(hr)
+        layout = self.layout
+
+        # Where ImageDraw would put the pen on the baseline for TEXT_ANCHOR at the text position
+        anchored = self.font.getbbox(text, anchor=TEXT_ANCHOR)
+        baseline = self.font.getbbox(text, anchor=TEXT_ANCHOR[0] + "s")
+        pen_x = layout.text_x + anchored[0] - baseline[0]
+        pen_y = layout.height // 2 + anchored[1] - baseline[1]
+
+        placed = []
+        for k, glyph in enumerate(text):
+            index, left, top = self.glyph_offsets[glyph]
+            x = pen_x + int(self.font.getlength(text[:k])) + left
+            placed.append((self.glyph_atlas[index], x, pen_y + top))
+
+        x0 = min(x for _, x, _ in placed)
+        y0 = min(y for _, _, y in placed)
+        x1 = max(x + mask.shape[1] for mask, x, _ in placed)
+        y1 = max(y + mask.shape[0] for mask, _, y in placed)
+
+        # Overlapping glyphs keep the higher coverage, as FreeType's bitmap does
+        coverage = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        for mask, x, y in placed:
+            region = coverage[y - y0:y - y0 + mask.shape[0], x - x0:x - x0 + mask.shape[1]]
+            np.maximum(region, mask, out=region)
+        return coverage, x0, y0
+
+    def get_text_image(self, hr):
+        if hr not in self.text_cache:
+            layout = self.layout
+            img = Image.new("RGBA", (layout.text_width, layout.height), (0, 0, 0, 0))
             d = ImageDraw.Draw(img)
             d.text(
-                (0, HEIGHT // 2),
-                str(hr),
-                font=font,
-                fill=hr_to_color(hr),
+                (0, layout.height // 2),
+                NO_READING_TEXT if hr == NO_READING else str(hr),
+                font=self.font,
+                fill=self.text_color(hr),
                 anchor=TEXT_ANCHOR
             )
-            text_cache[hr] = img
-        return text_cache[hr]
+            self.text_cache[hr] = img
+        return self.text_cache[hr]
 
-    # ========================================================
-    # HEARTBEAT ENGINE (STATEFUL)
-    # ========================================================
-    smoothed_hr = None
-    beat_phase = 0.0
+    def make_frame(self, hr, heart_idx):
+        layout = self.layout
+        img = self.frame_base.copy()
+
+        heart = self.heart_cache[heart_idx]
+
+        hx = layout.heart_x_center - heart.width // 2
+        hy = (layout.height - heart.height) // 2
+        img.paste(heart, (hx, hy), heart)
 
-    def heartbeat_scale(dt, target_hr):
-        nonlocal smoothed_hr, beat_phase
+        text_img = self.get_text_image(hr)
+        img.alpha_composite(text_img, (layout.text_x, 0))
 
-        if smoothed_hr is None:
-            smoothed_hr = target_hr
+        return np.asarray(img, dtype=np.uint8)
+
+
+# ============================================================
+# YUVA COMPOSITING (NATIVE PIXEL_FORMAT, NO PER-FRAME SWSCALE)
+# ============================================================
+# BT.601 limited range, the matrix swscale uses for rgba -> yuva444p10le
+RGB_TO_YUV = np.array([
+    [0.299, 0.587, 0.114],
+    [-0.168736, -0.331264, 0.5],
+    [0.5, -0.418688, -0.081312],
+])
+YUV_RANGE = np.array([219.0, 224.0, 224.0])
+YUV_OFFSET = np.array([16.0, 128.0, 128.0])
+YUV_BITS_SCALE = 4.0  # 8-bit code values -> 10-bit
+ALPHA_MAX = 1023
+# Composed planes (10-bit YUV code values) -> 8-bit RGB in one affine step
+PLANES_TO_RGB = (np.linalg.inv(RGB_TO_YUV) / YUV_RANGE / YUV_BITS_SCALE * 255.0).astype(np.float32)
+PLANES_TO_RGB_OFFSET = (-(np.linalg.inv(RGB_TO_YUV) @ (YUV_OFFSET / YUV_RANGE)) * 255.0).astype(np.float32)
+PACKED_FORMATS = (PIXEL_FORMAT, "yuva420p", "rgba", "argb")  # what pack_video_frame can produce
+
+
+def _planar_frame(planes, pix_fmt, dtype):
+    height, width = planes[0].shape
+    video_frame = av.VideoFrame(width, height, pix_fmt)
+    for plane, values in zip(video_frame.planes, planes):
+        dst = np.frombuffer(plane, dtype=dtype).reshape(plane.height, -1)
+        dst[:, :plane.width] = values
+    return video_frame
+
+
+def rgba_to_yuva(rgba):
+    """Converts an (H, W, 4) uint8 RGBA array to float32 (4, H, W) planes: 10-bit Y, U, V and alpha in [0, 1]."""
+    rgba = np.asarray(rgba, dtype=np.float64) / 255.0
+    yuv = rgba[..., :3] @ RGB_TO_YUV.T * YUV_RANGE + YUV_OFFSET
+    planes = np.concatenate([yuv * YUV_BITS_SCALE, rgba[..., 3:]], axis=-1)
+    return np.ascontiguousarray(planes.transpose(2, 0, 1), dtype=np.float32)
+
+
+def _alpha_over(dst, color, src_a):
+    """Image.alpha_composite in place: color planes with straight alpha src_a "over" the planes dst."""
+    dst_a = dst[3] * (1.0 - src_a)
+    out_a = src_a + dst_a
+    weight = np.divide(src_a, out_a, out=np.zeros_like(out_a), where=out_a > 0)
+    dst[:3] += (color - dst[:3]) * weight
+    dst[3] = out_a
+
+
+def yuva_sprite(img, x, y, layout):
+    """Pre-converts a PIL RGBA sprite placed at (x, y), cropped to its visible pixels inside the frame."""
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + img.width, layout.width), min(y + img.height, layout.height)
+    img = img.crop((x0 - x, y0 - y, x1 - x, y1 - y))
+
+    bbox = img.getchannel("A").getbbox()
+    if bbox is None:
+        return None
+
+    planes = rgba_to_yuva(img.crop(bbox))
+    return planes, x0 + bbox[0], y0 + bbox[1]
+
+
+class YuvaCompositor:
+    """
+    Composites overlay frames directly in PIXEL_FORMAT space. frame_base and every heart
+    are converted once, the hearts into one SpriteAtlas; because RGB -> YUV is affine,
+    blending the converted planes with the sprite alpha gives the same result as blending
+    in RGBA and converting afterwards. Text is blitted from the assets' glyph atlas as a
+    coverage mask over a flat color, so a frame only touches the pixels it changes.
+    With sparkline_columns the base also carries a Sparkline of them.
+    """
+
+    def __init__(self, assets, sparkline_columns=None, sparkline_offset=0):
+        self.assets = assets
+        self.layout = layout = assets.layout
+        self.base = rgba_to_yuva(np.asarray(assets.frame_base))
+        self.sparkline = Sparkline(self, sparkline_columns, sparkline_offset) if sparkline_columns is not None else None
+
+        hearts = [
+            yuva_sprite(
+                heart,
+                layout.heart_x_center - heart.width // 2,
+                (layout.height - heart.height) // 2,
+                layout
+            )
+            for heart in (assets.heart_cache[i] for i in range(SCALE_STEPS))
+        ]
+        self.heart_atlas = SpriteAtlas(planes for planes, _, _ in hearts)
+        self.heart_positions = [(x, y) for _, x, y in hearts]
+        self.text_cache = {}
+
+    def get_text_sprite(self, hr):
+        """(color, alpha, x, y): color as (3, 1, 1) planes, alpha cropped to the frame."""
+        if hr not in self.text_cache:
+            coverage, x, y = self.assets.text_mask(hr)
+
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + coverage.shape[1], self.layout.width), min(y + coverage.shape[0], self.layout.height)
+            alpha = (coverage[y0 - y:y1 - y, x0 - x:x1 - x] / 255.0).astype(np.float32)
+
+            color = rgba_to_yuva(np.array([[self.assets.text_color(hr) + (255,)]], dtype=np.uint8))[:3]
+            self.text_cache[hr] = (color, alpha, x0, y0) if alpha.size else None
+        return self.text_cache[hr]
+
+    def compose(self, hr, heart_idx):
+        """Returns the frame as float32 (4, H, W) planes."""
+        img = self.base.copy()
+
+        # Image.paste(heart, box, heart): every channel, alpha included, is mixed by the sprite alpha
+        planes = self.heart_atlas[heart_idx]
+        x, y = self.heart_positions[heart_idx]
+        dst = img[:, y:y + planes.shape[1], x:x + planes.shape[2]]
+        mask = planes[3]
+        dst += (planes - dst) * mask
+
+        text = self.get_text_sprite(hr)
+        if text is not None:
+            color, src_a, x, y = text
+            _alpha_over(img[:, y:y + src_a.shape[0], x:x + src_a.shape[1]], color, src_a)
+
+        return img
+
+    @staticmethod
+    def pack_video_frame(img, opacity=1.0, pix_fmt=PIXEL_FORMAT):
+        """Quantizes composed planes into an encoder-ready frame of pix_fmt (see PACKED_FORMATS)."""
+        if pix_fmt == PIXEL_FORMAT:
+            img[3] *= ALPHA_MAX * opacity
+            out = np.rint(np.clip(img, 0, ALPHA_MAX)).astype(np.uint16)
+            return _planar_frame(out, pix_fmt, np.uint16)
+
+        height, width = img.shape[1:]
+
+        if pix_fmt == "yuva420p":
+            yuv = img[:3] / YUV_BITS_SCALE
+            # 2x2 chroma average, the frame size is even
+            chroma = yuv[1:].reshape(2, height // 2, 2, width // 2, 2).mean(axis=(2, 4))
+            alpha = img[3] * (255 * opacity)
+            planes = [yuv[0], chroma[0], chroma[1], alpha]
+            out = [np.rint(np.clip(p, 0, 255)).astype(np.uint8) for p in planes]
+            return _planar_frame(out, pix_fmt, np.uint8)
+
+        if pix_fmt in ("rgba", "argb"):
+            # RGB -> YUV is affine, so the composed planes convert back exactly
+            channels = np.empty((4, height * width), dtype=np.float32)
+            rgb_at, alpha_at = (slice(1, 4), 0) if pix_fmt == "argb" else (slice(0, 3), 3)
+            channels[rgb_at] = PLANES_TO_RGB @ img[:3].reshape(3, -1) + PLANES_TO_RGB_OFFSET[:, None]
+            channels[alpha_at] = img[3].ravel() * (255 * opacity)
+            packed = np.rint(np.clip(channels, 0, 255, out=channels)).astype(np.uint8)
+            return av.VideoFrame.from_ndarray(packed.T.reshape(height, width, 4), format=pix_fmt)
+
+        raise ValueError(f"Can't pack frames as {pix_fmt}, use one of {PACKED_FORMATS}")
+
+
+# ============================================================
+# SPARKLINE (SCROLLING HR HISTORY)
+# ============================================================
+def sparkline_range(columns):
+    """(low, high) bpm the sparkline's height spans: the range of the columns, at least SPARKLINE_MIN_SPAN."""
+    values = columns[columns != NO_READING]
+    low, high = (int(values.min()), int(values.max())) if values.size else (MIN_HR, MIN_HR)
+    pad = max(0, SPARKLINE_MIN_SPAN - (high - low))
+    return low - pad // 2, high + pad - pad // 2
+
+
+def sparkline_history(columns, start, end, layout):
+    """
+    What the sparkline of frames [start, end) depends on: the columns they show, plus the
+    one before that the first line starts from, and the range they're drawn over.
+    """
+    first = start // layout.sparkline_column_frames
+    last = (end - 1) // layout.sparkline_column_frames
+    return columns[max(0, first - layout.sparkline_width):last + 1], sparkline_range(columns)
+
+
+class Sparkline:
+    """
+    The heart rate history as a line scrolling right to left through the layout's sparkline
+    band, drawn into the compositor's base planes so compose() costs the same with it.
+    columns[k] is the shown_hr of frame k * column_frames, which is when it enters at the
+    right edge; every column_frames the band scrolls by one pixel column.
+
+    The line is kept as its own (4, h, w) layer. Scrolling shifts the layer in place and
+    rasterizes only the newly exposed column, colored by the hr_to_color zone of its value;
+    the band is then composited once over its background until the next column. A frame
+    that doesn't follow the last one (a segment's first) seeds the layer from the columns
+    before it the same way, so a segment starts exactly where the previous one ended.
+    Values map onto the band's height over sparkline_range(columns), NO_READING is a gap.
+    frame_offset is how many frames of the columns' timeline come before the first frame
+    rendered, a clip's pre-roll.
+    """
+
+    def __init__(self, compositor, columns, frame_offset=0):
+        layout = compositor.layout
+        x, y = layout.sparkline_x, layout.sparkline_y
+        self.width, self.height = layout.sparkline_width, layout.sparkline_height
+        self.line_width = layout.sparkline_line_width
+        self.column_frames = layout.sparkline_column_frames
+        self.frame_offset = frame_offset
+        self.assets = compositor.assets
+
+        self.columns = np.asarray(columns, dtype=np.int64)
+        self.hr_low, self.hr_high = sparkline_range(self.columns)
+
+        self.band = compositor.base[:, y:y + self.height, x:x + self.width]  # view, drawn in place
+        self.background = self.band.copy()
+        self.layer = np.zeros_like(self.background)
+        self.rows = np.arange(self.height, dtype=np.float32)
+        self.colors = {}  # hr -> (3, 1) color planes
+
+        self.column = None  # index of the rightmost column drawn
+        self._previous_y = None  # line center of that column, None after a gap
+
+    def show(self, frame):
+        """Brings the band to the given frame, returns its column index (the band's state)."""
+        column = (frame + self.frame_offset) // self.column_frames
+        if column != self.column:
+            if self.column is not None and column == self.column + 1:
+                self._scroll(int(self.columns[column]))
+            else:
+                self._seed(column)
+            self.column = column
+
+            self.band[...] = self.background
+            _alpha_over(self.band, self.layer[:3], self.layer[3])
+        return column
+
+    def _seed(self, column):
+        self.layer[...] = 0.0
+        first = max(0, column - self.width + 1)
+        previous = int(self.columns[first - 1]) if first else NO_READING
+        self._previous_y = None if previous == NO_READING else self._line_y(previous)
+        for value in self.columns[first:column + 1].tolist():
+            self._scroll(value)
+
+    def _scroll(self, value):
+        layer = self.layer
+        layer[:, :, :-1] = layer[:, :, 1:]
+        exposed = layer[:, :, -1]
+
+        if value == NO_READING:
+            exposed[3] = 0.0
+            self._previous_y = None
+            return
+
+        # A vertical run from the previous column's line center to this one, line_width thick,
+        # with fractional coverage at its ends
+        y = self._line_y(value)
+        top, bottom = (y, y) if self._previous_y is None else sorted((self._previous_y, y))
+        half = self.line_width / 2
+        exposed[3] = np.clip(np.minimum(self.rows + 1.0, bottom + half) - np.maximum(self.rows, top - half), 0.0, 1.0)
+        exposed[:3] = self._color(value)
+        self._previous_y = y
+
+    def _line_y(self, hr):
+        """Line center of a value, in pixels from the top of the band."""
+        span = self.height - self.line_width
+        return self.line_width / 2 + (self.hr_high - hr) / (self.hr_high - self.hr_low) * span
+
+    def _color(self, hr):
+        if hr not in self.colors:
+            rgba = np.array([[self.assets.hr_to_color(hr) + (255,)]], dtype=np.uint8)
+            self.colors[hr] = rgba_to_yuva(rgba)[:3, 0]
+        return self.colors[hr]
+
+
+# ============================================================
+# RESAMPLING (LOG ROWS -> FRAMES)
+# ============================================================
+def resample_hr(seconds, heart_rate, interpolation=INTERPOLATION, gap_policy=GAP_POLICY, gap_markers=None,
+                frames=None):
+    """
+    Builds per-frame series from samples taken at the given times (seconds from the log start).
+    The timeline runs from the first sample to SAMPLE_PERIOD past the last one.
+    frames=(first, end) builds only those frames of it, from part of a log: seconds then
+    count from the whole log's first sample (see HeartRateLog.origin_ms) and the samples
+    must run from the one in effect at first to the one after end (LogIndex.read_range).
+    gap_markers are the times the recorder lost the connection (HeartRateLog.gap_seconds):
+    a gap starts right at a marker instead of GAP_SECONDS into the silence.
+
+    interpolation: "hold" keeps the latest sample, "linear" interpolates between samples.
+    gap_policy: what a silence longer than GAP_SECONDS shows after it starts. "freeze" keeps
+    the last value, "dashes" shows NO_READING_TEXT and "fade" fades the overlay out over
+    FADE_SECONDS. The heartbeat keeps following the last value in every case.
+
+    Returns (target_hr, shown_hr, opacity): the heartbeat target, the displayed value
+    (NO_READING for dashes) and the overlay opacity in [0, 1], one entry per frame.
+    """
+    if interpolation not in ("hold", "linear"):
+        raise ValueError(f"Unknown interpolation: {interpolation}")
+    if gap_policy not in ("freeze", "fade", "dashes"):
+        raise ValueError(f"Unknown gap policy: {gap_policy}")
+
+    seconds = np.asarray(seconds, dtype=np.float64)
+    heart_rate = np.asarray(heart_rate)
+    if len(seconds) == 0:
+        raise ValueError("Heart rate log has no samples")
+
+    # Sort (stable, so bursts keep their order) and keep the last sample of each timestamp
+    order = np.argsort(seconds, kind="stable")
+    seconds, heart_rate = seconds[order], heart_rate[order]
+    last_of_run = np.append(seconds[1:] != seconds[:-1], True)
+    seconds, heart_rate = seconds[last_of_run], heart_rate[last_of_run]
+    origin = seconds[0] if frames is None else 0.0
+    seconds -= origin
+    # Sentinels on both ends keep every marker lookup in bounds
+    markers = np.sort(np.asarray(gap_markers if gap_markers is not None else [], dtype=np.float64) - origin)
+    markers = np.concatenate(([-np.inf], markers, [np.inf]))
+
+    if frames is None:
+        frames = (0, int(round((seconds[-1] + SAMPLE_PERIOD) * FPS)))
+    t = np.arange(*frames) / FPS
+
+    latest = np.searchsorted(seconds, t, side="right") - 1
+    held = heart_rate[latest]
+    silence_start = seconds[latest] + GAP_SECONDS
+
+    # A marker after the latest sample means the connection is known to be down
+    marker_time = markers[np.searchsorted(markers, t, side="right") - 1]
+    marked = marker_time >= seconds[latest]
+    gap_start = np.where(marked, np.minimum(marker_time, silence_start), silence_start)
+    in_gap = marked | (t > silence_start)
+
+    if interpolation == "linear":
+        interpolated = np.rint(np.interp(t, seconds, heart_rate))
+        # Never interpolate across a dropout, the value is unknown there
+        following = np.minimum(latest + 1, len(seconds) - 1)
+        bridged = (seconds[following] - seconds[latest]) > GAP_SECONDS
+        bridged |= markers[np.searchsorted(markers, seconds[latest], side="left")] < seconds[following]
+        target_hr = np.where(bridged, held, interpolated).astype(np.int16)
+    else:
+        target_hr = held.astype(np.int16)
+
+    shown_hr = target_hr.copy()
+    opacity = np.ones(len(t), dtype=np.float32)
+
+    if gap_policy == "dashes":
+        shown_hr[in_gap] = NO_READING
+    elif gap_policy == "fade":
+        faded = 1.0 - (t - gap_start) / FADE_SECONDS
+        opacity = np.where(in_gap, np.clip(faded, 0.0, 1.0), 1.0).astype(np.float32)
+
+    return target_hr, shown_hr, opacity
+
+
+# ============================================================
+# HEARTBEAT ENGINE (VECTORIZED)
+# ============================================================
+EMA_BLOCK = 256  # frames per cumsum block, keeps (1 - HR_SMOOTHING) ** -EMA_BLOCK finite
+
+
+def _ema(x, alpha, initial):
+    """Vectorized s[n] = s[n-1] + (x[n] - s[n-1]) * alpha, starting from s[-1] = initial."""
+    n = len(x)
+    decay = 1.0 - alpha
+    pad = (-n) % EMA_BLOCK
+    blocks = np.concatenate([x, np.zeros(pad)]).reshape(-1, EMA_BLOCK)
+
+    # Inside a block: s[k] = decay^(k+1) * carry + alpha * decay^k * sum_{i<=k} decay^-i * x[i]
+    k = np.arange(EMA_BLOCK)
+    local = alpha * decay ** k * np.cumsum(blocks * decay ** -k, axis=1)
+    carry_weight = decay ** (k + 1)
+
+    # Only the carry between blocks is sequential
+    carries = np.empty(len(blocks))
+    carry = initial
+    for b, last in enumerate(local[:, -1]):
+        carries[b] = carry
+        carry = last + carry_weight[-1] * carry
+
+    return (local + carries[:, None] * carry_weight).ravel()[:n]
+
+
+def _wrapped_cumsum(increments, start):
+    """(start + cumsum(increments)) % 1.0, wrapped per block so long sessions keep precision."""
+    n = len(increments)
+    pad = (-n) % EMA_BLOCK
+    blocks = np.cumsum(np.concatenate([increments, np.zeros(pad)]).reshape(-1, EMA_BLOCK), axis=1)
+
+    carries = np.empty(len(blocks))
+    carry = start
+    for b, total in enumerate(blocks[:, -1]):
+        carries[b] = carry
+        carry = (carry + total) % 1.0
+
+    return ((blocks + carries[:, None]) % 1.0).ravel()[:n]
+
+
+def heartbeat_pulse(beat_phase):
+    """Lub/dub pulse height (0..~1) for an array of beat phases in [0, 1)."""
+    lub_rise = np.sin(beat_phase / LUB_RISE_END * math.pi * 0.5)
+    lub_decay = np.exp(
+        -LUB_DECAY_STRENGTH * (beat_phase - LUB_RISE_END) / (LUB_DECAY_END - LUB_RISE_END)
+    )
+    dub = np.sin((beat_phase - DUB_START) / DUB_DURATION * math.pi)
+
+    pulse = np.where(
+        beat_phase < LUB_RISE_END,
+        lub_rise,
+        np.where(beat_phase < LUB_DECAY_END, lub_decay, 0.0)
+    )
+    pulse += np.where(
+        (beat_phase >= DUB_START) & (beat_phase < DUB_START + DUB_DURATION),
+        dub,
+        0.0
+    )
+    return pulse
+
+
+def heart_index(scale):
+    """Maps heart scales to their entry in the SCALE_STEPS heart cache."""
+    idx = ((scale - 1.0) / BEAT_SCALE * (SCALE_STEPS - 1)).astype(np.int64)
+    return np.clip(idx, 0, SCALE_STEPS - 1)
+
+
+def heartbeat_track(target_hr, dt, smoothed_hr=None, beat_phase=0.0):
+    """
+    Runs the heartbeat animation over a whole per-frame target_hr array.
+    Returns (scale, heart_idx, smoothed_hr, beat_phase) arrays with one entry per frame;
+    passing the last smoothed_hr/beat_phase back in continues the animation seamlessly.
+    """
+    target_hr = np.asarray(target_hr, dtype=np.float64)
+    if len(target_hr) == 0:
+        empty = np.empty(0)
+        return empty, empty.astype(np.int64), empty, empty
+
+    if smoothed_hr is None:
+        smoothed_hr = target_hr[0]
+
+    smoothed = _ema(target_hr, HR_SMOOTHING, smoothed_hr)
+
+    seconds_per_beat = 60.0 / (smoothed * HR_RATE_MULTIPLIER)
+    phase = _wrapped_cumsum(dt / seconds_per_beat, beat_phase)
+
+    scale = 1.0 + BEAT_SCALE * heartbeat_pulse(phase)
+    return scale, heart_index(scale), smoothed, phase
+
+
+def heartbeat_state(target_hr, target_sum_before=0, initial_hr=None):
+    """
+    The (smoothed_hr, beat_phase) heartbeat_track reaches at the end of target_hr, the last
+    frames before a clip, to continue from. The smoothed rate forgets where it started
+    within a few seconds, so running over these frames is enough. The phase never does:
+    it sums the smoothed rate over the whole timeline. That sum follows from the targets'
+    though, since an EMA's running sum is its input's less how far it moved,
+    sum(s) = sum(x) - (s[n] - s[-1]) * (1 - a) / a. target_sum_before is the sum of
+    target_hr over the frames before these and initial_hr the first frame's, None if
+    target_hr starts at frame 0.
+    """
+    target_hr = np.asarray(target_hr, dtype=np.float64)
+    if initial_hr is None:
+        initial_hr = target_hr[0]
+
+    _, _, smoothed, _ = heartbeat_track(target_hr, 1.0 / FPS)
+    target_sum = target_sum_before + target_hr.sum()
+    smoothed_sum = target_sum - (smoothed[-1] - initial_hr) * (1.0 - HR_SMOOTHING) / HR_SMOOTHING
+    return smoothed[-1], smoothed_sum / FPS * HR_RATE_MULTIPLIER / 60.0 % 1.0
+
+
+def rr_beat_phase(frame_seconds, beat_seconds, fallback_phase):
+    """
+    Beat phase from measured beat times: 0 on each beat, rising linearly to 1 at the next.
+    Frames before the first beat, after the last or inside an interval longer than
+    MAX_BEAT_INTERVAL keep fallback_phase.
+    """
+    if len(beat_seconds) < 2:
+        return fallback_phase
+
+    following = np.searchsorted(beat_seconds, frame_seconds, side="right")
+    previous = np.clip(following - 1, 0, len(beat_seconds) - 1)
+    following = np.clip(following, 0, len(beat_seconds) - 1)
+
+    start = beat_seconds[previous]
+    interval = beat_seconds[following] - start
+    known = (frame_seconds >= start) & (interval > 0) & (interval <= MAX_BEAT_INTERVAL)
+
+    measured = (frame_seconds - start) / np.where(known, interval, 1.0)
+    return np.where(known, measured, fallback_phase)
+
+
+# ============================================================
+# PROGRESS
+# ============================================================
+class RenderProgress:
+    """
+    Turns frame counts into throttled progress reports. callback receives a dict with
+    frames_done, total_frames, fps (since the previous report), average_fps, eta_seconds
+    (None until known), elapsed_seconds, cache_hit_rate, encoder_queue_depth (frames
+    sent to the encoder that haven't come back as packets, high when encoding is the
+    bottleneck) and resumed_frames. Frames this render didn't encode (resumed_frames, from
+    a checkpoint or the render cache) count as done but not towards the fps.
+    """
+
+    def __init__(self, total_frames, callback, interval=PROGRESS_INTERVAL, resumed_frames=0):
+        self.total_frames = total_frames
+        self.callback = callback
+        self.interval = interval
+        self.resumed_frames = resumed_frames
+        self.start = time.perf_counter()
+        self._next_report = self.start + interval
+        self._last_time = self.start
+        self._last_frames = resumed_frames
+
+    def __call__(self, frames_done, cache, queue_depth, force=False):
+        """encode_frames hook, see update()."""
+        self.update(frames_done, cache.hits, cache.misses, queue_depth, force)
+
+    def offset(self, frames_before):
+        """encode_frames hook for a segment that starts after frames_before finished frames."""
+        def hook(frames_done, cache, queue_depth, force=False):
+            self(frames_before + frames_done, cache, queue_depth, force)
+        return hook
+
+    def update(self, frames_done, cache_hits, cache_misses, queue_depth, force=False):
+        """Cheap unless a report is due: call it as often as convenient."""
+        now = time.perf_counter()
+        if now < self._next_report and not force:
+            return
+        self._next_report = now + self.interval
+
+        elapsed = now - self.start
+        fps = (frames_done - self._last_frames) / (now - self._last_time) if now > self._last_time else 0.0
+        average_fps = (frames_done - self.resumed_frames) / elapsed if elapsed > 0 else 0.0
+        self._last_time, self._last_frames = now, frames_done
+
+        lookups = cache_hits + cache_misses
+        self.callback({
+            "frames_done": frames_done,
+            "total_frames": self.total_frames,
+            "fps": fps,
+            "average_fps": average_fps,
+            "eta_seconds": (self.total_frames - frames_done) / average_fps if average_fps > 0 else None,
+            "elapsed_seconds": elapsed,
+            "cache_hit_rate": cache_hits / lookups if lookups else 0.0,
+            "encoder_queue_depth": queue_depth,
+            "resumed_frames": self.resumed_frames,
+        })
+
+
+class _SegmentProgressCollector:
+    """Sums the reports of the segment workers and the resumed segments into progress."""
+
+    def __init__(self, progress, progress_queue, segments, completed):
+        self.progress = progress
+        self.progress_queue = progress_queue
+        self.segments = segments
+        self.latest = {index: (self._length(index), 0, 0, 0) for index in completed}  # -> (frames, hits, misses, depth)
+        self._finished = set(completed)
+
+    def _length(self, index):
+        start, end = self.segments[index]
+        return end - start
+
+    def finished(self, index, hits, misses):
+        # A finished job's result is exact, its last report may still be in the queue
+        self.latest[index] = (self._length(index), hits, misses, 0)
+        self._finished.add(index)
+
+    def poll(self, force=False):
+        if self.progress is None:
+            return
+
+        while True:
+            try:
+                index, *state = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if index not in self._finished:
+                self.latest[index] = state
+
+        totals = [sum(column) for column in zip(*self.latest.values())] or [0, 0, 0, 0]
+        self.progress.update(*totals, force=force)
+
+
+# ============================================================
+# CHECKPOINTS AND RENDER CACHE
+# ============================================================
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_config_key(hr_interval_1, hr_interval_2, interpolation, gap_policy, beat_source, encode_options,
+                      scale=1.0, sparkline=False, clip=None):
+    """Digest of everything but the log that decides the output: the options, CACHE_KEY_CONSTANTS and assets."""
+    config = {name: globals()[name] for name in CACHE_KEY_CONSTANTS}
+    config.update(
+        hr_intervals=[hr_interval_1, hr_interval_2],
+        interpolation=interpolation,
+        gap_policy=gap_policy,
+        beat_source=beat_source,
+        encode_options=list(encode_options),
+        scale=scale,
+        sparkline=sparkline,
+        clip=list(clip) if clip else None,
+        assets=[file_digest(FONT_PATH), file_digest(HEART_IMAGE_PATH)],
+    )
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def segment_digest(shown_hr, heart_idx, opacity_level, *history):
+    """
+    Content address of a segment: its per-frame states decide every pixel of it, together
+    with the sparkline history it shows if there is one (see sparkline_history).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for states in (shown_hr, heart_idx, opacity_level, *history):
+        digest.update(np.ascontiguousarray(states, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    # Replace in one step so an interrupted write never leaves a broken file
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class RenderCancelled(Exception):
+    """Raised by render_video when its cancel_event is set. Finished segments are kept."""
+
+
+class RenderCheckpoint:
+    """
+    The finished segments of a render, listed in CHECKPOINT_FILE in work_dir next to the
+    segment files. A listed segment is reused only while the render settings (config key)
+    are the same and it starts from the same heartbeat state with the same frames; other
+    segments are rendered again. A segment is listed after its file is closed, so a
+    half-written one is simply rendered again.
+    """
+
+    def __init__(self, work_dir, settings, segment_states, resume=True):
+        self.work_dir = Path(work_dir)
+        self.path = self.work_dir / CHECKPOINT_FILE
+        self.settings = settings
+        self.segment_states = segment_states
+        self.completed = set()
+
+        saved = self._load() if resume else None
+        if saved is not None and saved["settings"] == settings:
+            self.completed = {
+                index for index, state in saved["segments"]
+                if index < len(segment_states) and state == segment_states[index]
+            }
         else:
-            smoothed_hr += (target_hr - smoothed_hr) * HR_SMOOTHING
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
 
-        seconds_per_beat = 60.0 / (smoothed_hr * HR_RATE_MULTIPLIER)
-        beat_phase = (beat_phase + dt / seconds_per_beat) % 1.0
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
 
-        pulse = 0.0
+    def mark_done(self, index):
+        self.completed.add(index)
+        _write_json(self.path, {
+            "settings": self.settings,
+            "segments": [[i, self.segment_states[i]] for i in sorted(self.completed)],
+        })
 
-        if beat_phase < LUB_RISE_END:
-            x = beat_phase / LUB_RISE_END
-            pulse += math.sin(x * math.pi * 0.5)
-        elif beat_phase < LUB_DECAY_END:
-            x = (beat_phase - LUB_RISE_END) / (LUB_DECAY_END - LUB_RISE_END)
-            pulse += math.exp(-LUB_DECAY_STRENGTH * x)
+    def remove(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
 
-        if DUB_START <= beat_phase < DUB_START + DUB_DURATION:
-            x = (beat_phase - DUB_START) / DUB_DURATION
-            pulse += math.sin(x * math.pi)
 
-        return 1.0 + BEAT_SCALE * pulse
+class RenderCache:
+    """
+    Manifest of a finished output, kept next to it as ".<output name>.json": the config key
+    (render_config_key), the log's digest and every segment's state (see RenderCheckpoint).
+    A matching log and key means the output is current. Otherwise segments whose state and
+    frame digest are unchanged can be copied out of the output, e.g. all but the tail of a
+    log that grew, since every output is the concatenation of its segments.
+    """
 
-    # ========================================================
-    # FRAME RENDER
-    # ========================================================
-    def make_frame(frame_idx):
-        hr = hr_array[min(frame_idx // FPS, len(hr_array) - 1)]
+    def __init__(self, output_file):
+        self.output_file = Path(output_file)
+        self.path = self.output_file.with_name(f".{self.output_file.name}.json")
+        self.entry = None
 
-        img = frame_base.copy()
+        if self.output_file.exists():
+            try:
+                with open(self.path) as f:
+                    self.entry = json.load(f)
+            except (OSError, ValueError):
+                pass
 
-        scale = heartbeat_scale(dt, hr)
-        heart = get_cached_heart(scale)
+    @property
+    def total_frames(self):
+        return self.entry["total_frames"]
 
-        hx = HEART_X_CENTER - heart.width // 2
-        hy = (HEIGHT - heart.height) // 2
-        img.paste(heart, (hx, hy), heart)
+    def is_current(self, config_key, log_digest):
+        return self.entry is not None and self.entry["config"] == config_key and self.entry["log"] == log_digest
 
-        text_img = get_text_image(hr)
-        img.alpha_composite(text_img, (HEART_SIZE + TEXT_X_OFFSET, 0))
+    def matching_segments(self, config_key, segment_states):
+        """Indices of segment_states the output already holds."""
+        if self.entry is None or self.entry["config"] != config_key:
+            return []
+        previous = self.entry["segments"]
+        return [i for i, state in enumerate(segment_states) if i < len(previous) and previous[i] == state]
 
-        return np.asarray(img, dtype=np.uint8)
+    def invalidate(self):
+        self.entry = None
+        self.path.unlink(missing_ok=True)
+
+    def store(self, config_key, log_digest, total_frames, segment_states):
+        self.entry = {
+            "config": config_key,
+            "log": log_digest,
+            "total_frames": total_frames,
+            "segments": segment_states,
+        }
+        _write_json(self.path, self.entry)
 
-    # ========================================================
-    # ENCODE
-    # ========================================================
-    container = av.open(str(output_file), "w")
-
-    stream = container.add_stream("prores_ks", rate=FPS)
-    stream.width = WIDTH
-    stream.height = HEIGHT
-    stream.pix_fmt = PIXEL_FORMAT
-    stream.options = {
-        "profile": PRORES_PROFILE,
-        "qscale": PRORES_QSCALE
-    }
-
-    for i in range(total_frames):
-        frame = make_frame(i)
-        video_frame = av.VideoFrame.from_ndarray(frame, format="rgba")
-        video_frame = video_frame.reformat(
-            width=WIDTH,
-            height=HEIGHT,
-            format=PIXEL_FORMAT
-        )
 
-        for packet in stream.encode(video_frame):
+# ============================================================
+# FRAME CACHE (DEDUPLICATED ENCODER INPUT)
+# ============================================================
+class FrameCache:
+    """
+    LRU cache of encoder-ready frames keyed on the frame state (hr, heart_idx, opacity level),
+    plus the sparkline column when the compositor has a Sparkline. A frame is fully
+    determined by that state, so every repeat skips compositing and the colorspace
+    conversion. Memory is bounded by max_bytes. The live overlay keeps its RGBA frames
+    in one too, with their size given to put().
+    """
+
+    def __init__(self, max_bytes=FRAME_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+
+    def get(self, key):
+        frame = self._frames.get(key)
+        if frame is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._frames.move_to_end(key)
+        return frame[0]
+
+    def put(self, key, video_frame, size=None):
+        if size is None:
+            size = sum(plane.buffer_size for plane in video_frame.planes)
+        self._frames[key] = (video_frame, size)
+        self.size_bytes += size
+
+        while self.size_bytes > self.max_bytes and len(self._frames) > 1:
+            _, (_, evicted_size) = self._frames.popitem(last=False)
+            self.size_bytes -= evicted_size
+
+
+# ============================================================
+# ENCODE
+# ============================================================
+def encode_frames(output_file, compositor, shown_hr, heart_idx, opacity, cache=None, timer=None, progress=None,
+                  encode_options=(DEFAULT_ENCODER, None, None), start_frame=0, cancel_event=None):
+    """
+    Encodes one frame per entry of the per-frame shown_hr/heart_idx/opacity arrays into output_file.
+    encode_options is (encoder, preset, threads), see render_video; start_frame is the timeline
+    frame of the first entry, which numbers image sequences and places the compositor's Sparkline.
+    Returns the FrameCache used, whose counters tell how many frames were reused.
+    Time spent compositing, packing, encoding and muxing is added to timer if one is given.
+    progress(frames_done, cache, encoder_queue_depth, force=False) is called after every frame
+    and must throttle itself (see RenderProgress).
+    Raises RenderCancelled, leaving output_file incomplete, once cancel_event is set.
+    """
+    if cache is None:
+        cache = FrameCache()
+    if timer is None:
+        timer = StageTimer()
+
+    opacity_level = np.rint(opacity * OPACITY_STEPS).astype(np.int64)
+
+    encoder, preset, threads = encode_options
+    layout = compositor.layout
+    container, stream = get_encoder(encoder).open(
+        output_file, layout.width, layout.height, FPS, preset, threads, start_frame
+    )
+    pix_fmt = stream.pix_fmt
+
+    time_base = Fraction(1, FPS)
+
+    frame_states = zip(shown_hr.tolist(), heart_idx.tolist(), opacity_level.tolist())
+    sparkline = compositor.sparkline
+    packets_out = 0
+
+    for i, key in enumerate(frame_states):
+        if cancel_event is not None and cancel_event.is_set():
+            container.close()
+            raise RenderCancelled()
+
+        if sparkline is not None:
+            with timer("sparkline"):
+                key += (sparkline.show(start_frame + i),)
+
+        video_frame = cache.get(key)
+
+        if video_frame is None:
+            hr, idx, level = key[:3]
+            with timer("compose"):
+                img = compositor.compose(hr, idx)
+            with timer("reformat"):
+                video_frame = compositor.pack_video_frame(img, level / OPACITY_STEPS, pix_fmt)
+            cache.put(key, video_frame)
+
+        # Cached frames are sent more than once, so stamp them explicitly
+        video_frame.pts = i
+        video_frame.time_base = time_base
+
+        with timer("encode"):
+            packets = stream.encode(video_frame)
+        with timer("mux"):
+            for packet in packets:
+                container.mux(packet)
+
+        packets_out += len(packets)
+        if progress is not None:
+            progress(i + 1, cache, i + 1 - packets_out)
+
+    with timer("encode"):
+        packets = stream.encode()
+    with timer("mux"):
+        for packet in packets:
             container.mux(packet)
+        container.close()
 
-    for packet in stream.encode():
-        container.mux(packet)
+    if progress is not None:
+        progress(len(shown_hr), cache, 0, force=True)
+    return cache
 
-    container.close()
-    return str(output_file)
+
+# ============================================================
+# SEGMENT WORKERS (PROCESS POOL)
+# ============================================================
+_worker_compositor = None
+_worker_progress_queue = None
+_worker_encode_options = None
+_worker_cancel_event = None
+
+
+def _init_segment_worker(hr_interval_1, hr_interval_2, progress_queue=None, encode_options=None, cancel_event=None,
+                         scale=1.0, sparkline_columns=None, sparkline_offset=0):
+    global _worker_compositor, _worker_progress_queue, _worker_encode_options, _worker_cancel_event
+    _worker_compositor = YuvaCompositor(
+        OverlayAssets(hr_interval_1, hr_interval_2, OverlayLayout(scale)), sparkline_columns, sparkline_offset
+    )
+    _worker_progress_queue = progress_queue
+    _worker_encode_options = encode_options or (DEFAULT_ENCODER, None, None)
+    _worker_cancel_event = cancel_event
+
+
+class _SegmentProgress:
+    """encode_frames progress hook of a worker: throttled reports to the parent's queue."""
+
+    def __init__(self, index):
+        self.index = index
+        self._next_report = 0.0
+
+    def __call__(self, frames_done, cache, queue_depth, force=False):
+        now = time.perf_counter()
+        if now < self._next_report and not force:
+            return
+        self._next_report = now + PROGRESS_INTERVAL
+        _worker_progress_queue.put((self.index, frames_done, cache.hits, cache.misses, queue_depth))
+
+
+def _render_segment(segment_file, shown_hr, heart_idx, opacity, index=0, start_frame=0):
+    timer = StageTimer()
+    progress = _SegmentProgress(index) if _worker_progress_queue is not None else None
+    cache = encode_frames(
+        segment_file, _worker_compositor, shown_hr, heart_idx, opacity, timer=timer, progress=progress,
+        encode_options=_worker_encode_options, start_frame=start_frame, cancel_event=_worker_cancel_event
+    )
+    return cache.hits, cache.misses, timer.seconds